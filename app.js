@@ -152,7 +152,7 @@ let ancestorStructureIds = new Set();
 let noMeshIds = new Set();
 let dandisetToStructures = {};  // dandiset_id -> [structure_ids]
 let dandisetTitles = {};        // dandiset_id -> title string
-let dandisetAssets = {};        // dandiset_id -> [{path, asset_id, regions}]
+let dandisetAssets = {};        // cache: dandiset_id -> [{path, asset_id, regions}]
 let selectedDandiset = null;
 let dandisetElectrodes = {};  // cache: dandiset_id -> {asset_id: [[x,y,z], ...]}
 let electrodePoints = null;   // THREE.Points object
@@ -197,6 +197,7 @@ async function loadAtlas(atlasKey) {
   selectedId = null;
   hoveredId = null;
   selectedDandiset = null;
+  dandisetAssets = {};
   dandisetElectrodes = {};
   dandisetRegionFilter = null;
   dandisetSubjectCounts = null;
@@ -223,18 +224,16 @@ async function loadAtlas(atlasKey) {
   meshObjects = {};
   failedMeshIds.clear();
 
-  const [graphResp, regionsResp, manifestResp, assetsResp, electrodeManifestResp] = await Promise.all([
+  const [graphResp, regionsResp, manifestResp, electrodeManifestResp] = await Promise.all([
     fetch(`${activeAtlas.dataPrefix}structure_graph.json`).then(r => r.json()),
     fetch(`${activeAtlas.dataPrefix}dandi_regions.json`).then(r => r.json()),
     fetch(`${activeAtlas.dataPrefix}mesh_manifest.json`).then(r => r.json()),
-    fetch(`${activeAtlas.dataPrefix}dandiset_assets.json`).then(r => r.json()),
     fetch(`${activeAtlas.dataPrefix}dandisets_with_electrodes.json`).then(r => r.json()).catch(() => []),
   ]);
 
   structureGraph = graphResp;
   dandiRegions = regionsResp;
   meshManifest = manifestResp;
-  dandisetAssets = assetsResp;
 
   dandisetsWithElectrodes = new Set(electrodeManifestResp);
   dataStructureIds = new Set(meshManifest.data_structures);
@@ -1074,6 +1073,17 @@ function showAllRegions() {
   }
 }
 
+async function fetchDandisetAssets(dandisetId) {
+  if (dandisetAssets[dandisetId]) return dandisetAssets[dandisetId];
+  try {
+    const resp = await fetch(`${activeAtlas.dataPrefix}assets/${dandisetId}.json`);
+    if (!resp.ok) return [];
+    const data = await resp.json();
+    dandisetAssets[dandisetId] = data;
+    return data;
+  } catch { return []; }
+}
+
 function computeDandisetSubjectCounts(dandisetId) {
   const assets = dandisetAssets[dandisetId] || [];
 
@@ -1146,6 +1156,7 @@ async function enterDandisetView(dandisetId, { pushState = true } = {}) {
   return transitionView('dandiset', async () => {
     selectedDandiset = dandisetId;
     selectedId = null;
+    await fetchDandisetAssets(dandisetId);
     dandisetSubjectCounts = computeDandisetSubjectCounts(dandisetId);
     hiddenRegionIds = new Set();
     clearElectrodePoints();
@@ -1374,10 +1385,12 @@ function hideSubjectFilter() {
 
 async function updateDandisetPanel(dandisetId, structureIds) {
   const panel = document.getElementById('region-panel');
-  const assets = dandisetAssets[dandisetId] || [];
 
-  // Pre-fetch electrode data for this dandiset (lazy, cached)
-  await fetchElectrodes(dandisetId);
+  // Fetch asset and electrode data for this dandiset (lazy, cached)
+  const [assets] = await Promise.all([
+    fetchDandisetAssets(dandisetId),
+    fetchElectrodes(dandisetId),
+  ]);
 
   const title = dandisetTitles[dandisetId] || '';
 
@@ -5,13 +5,18 @@ Downloads Allen CCF structure graph, matches DANDI locations to CCF terms,
 and downloads OBJ meshes for relevant structures.
 """
 
-import json
 import os
+import pickle
+import shutil
 import sys
-import time
-import urllib.request
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+import orjson
+import requests
+from tqdm import tqdm
+
 PROJECT_ROOT = Path(__file__).parent.parent
 DATA_DIR = PROJECT_ROOT / "data" / "atlases" / "allen_ccf"
 MESHES_DIR = DATA_DIR / "meshes"
@@ -33,83 +38,167 @@ MESH_URL_TEMPLATE = (
     "current-release/mouse_ccf/annotation/ccf_2017/structure_meshes/{structure_id}.obj"
 )
 
+USER_AGENT = "brain-atlas-viewer/1.0"
+MESH_DOWNLOAD_WORKERS = 12
+
+
+def make_session() -> requests.Session:
+    """Create an HTTP session with a keep-alive pool sized for the mesh workers."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=4, pool_maxsize=MESH_DOWNLOAD_WORKERS
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
 
-def download_json(url: str) -> dict:
+def download_json(url: str, session: requests.Session) -> dict:
     """Download and parse JSON from a URL."""
     print(f"  Downloading {url[:80]}...")
-    req = urllib.request.Request(url, headers={"User-Agent": "brain-atlas-viewer/1.0"})
-    with urllib.request.urlopen(req, timeout=60) as resp:
-        return json.loads(resp.read().decode("utf-8"))
+    resp = session.get(url, timeout=60)
+    resp.raise_for_status()
+    return orjson.loads(resp.content)
 
 
-def download_file(url: str, dest: Path) -> bool:
+def url_exists(url: str, session: requests.Session) -> bool:
+    """HEAD-check a URL. Returns False only if the server reports it missing."""
+    try:
+        resp = session.head(url, timeout=10, allow_redirects=True)
+    except requests.RequestException:
+        return True  # inconclusive; let the GET decide
+    return resp.status_code != 404
+
+
+def download_file(url: str, dest: Path, session: requests.Session) -> bool:
     """Download a file to disk. Returns True if successful."""
     if dest.exists():
         return True
+    # Stream into a temporary file so an interrupted download never leaves a
+    # truncated mesh behind that would be skipped as "already downloaded".
+    tmp = dest.with_name(dest.name + ".part")
     try:
-        req = urllib.request.Request(
-            url, headers={"User-Agent": "brain-atlas-viewer/1.0"}
-        )
-        with urllib.request.urlopen(req, timeout=60) as resp:
-            dest.write_bytes(resp.read())
+        with session.get(url, timeout=60, stream=True) as resp:
+            resp.raise_for_status()
+            resp.raw.decode_content = True
+            with open(tmp, "wb") as f:
+                shutil.copyfileobj(resp.raw, f)
+        tmp.replace(dest)
         return True
     except Exception as e:
+        tmp.unlink(missing_ok=True)
         print(f"    Failed to download {url}: {e}")
         return False
 
 
 def flatten_structure_graph(msg: list) -> list:
-    """Recursively flatten the Allen structure graph tree into a flat list."""
+    """Flatten the Allen structure graph tree into a flat list (pre-order)."""
     result = []
-    for node in msg:
+    stack = list(reversed(msg))
+    while stack:
+        node = stack.pop()
         result.append(node)
-        if node.get("children"):
-            result.extend(flatten_structure_graph(node["children"]))
+        children = node.get("children")
+        if children:
+            stack.extend(reversed(children))
     return result
 
 
-def build_parent_map(structures: list) -> dict:
-    """Build a mapping from structure_id -> parent_structure_id."""
-    return {s["id"]: s.get("parent_structure_id") for s in structures}
+def build_ancestor_map(parent_map: dict) -> dict:
+    """Map each structure_id to a tuple of its ancestor IDs (nearest first).
+
+    Every chain is walked once: a node's tuple is its parent followed by the
+    parent's already-computed tuple.
+    """
+    ancestors = {}
+    for sid in parent_map:
+        path = []
+        current = sid
+        while current is not None and current not in ancestors:
+            path.append(current)
+            current = parent_map.get(current)
+        for node in reversed(path):
+            ancestors[node] = () if current is None else (current,) + ancestors[current]
+            current = node
+    return ancestors
 
 
-def get_ancestors(structure_id: int, parent_map: dict) -> list:
-    """Get all ancestor structure IDs (excluding self)."""
-    ancestors = []
-    current = parent_map.get(structure_id)
-    while current is not None:
-        ancestors.append(current)
-        current = parent_map.get(current)
-    return ancestors
+def load_label_matches(path: Path) -> tuple:
+    """Load label results as (summary, [(dandiset_id, structure_id), ...]).
+
+    Only results with a usable status contribute matches, one pair per matched
+    file location. Parsing the full label-results JSON dominates re-runs, so
+    the extracted pairs are pickled next to it and reused for as long as the
+    source file's mtime and size are unchanged. The pickle is best-effort: an
+    unreadable one is rebuilt, and one that cannot be written is skipped.
+    """
+    cache_path = path.with_suffix(".pkl")
+    stat = path.stat()
+    key = (stat.st_mtime_ns, stat.st_size)
+    if cache_path.exists():
+        try:
+            cached = pickle.loads(cache_path.read_bytes())
+            if cached["key"] == key:
+                return cached["summary"], cached["matches"]
+        except Exception:
+            # Corrupt or written by an incompatible version: rebuild it
+            pass
+
+    label_data = orjson.loads(path.read_bytes())
+    matches = []
+    for result in label_data["results"]:
+        if result["status"] not in ("would_update", "updated", "no_change"):
+            continue
+        dandiset_id = result["dandiset_id"]
+        for location_matches in result.get("matched_locations", {}).values():
+            for match in location_matches:
+                matches.append((dandiset_id, match["id"]))
+
+    summary = label_data["summary"]
+    try:
+        cache_path.write_bytes(pickle.dumps(
+            {"key": key, "summary": summary, "matches": matches}, protocol=5
+        ))
+    except OSError as exc:
+        print(f"  Could not write {cache_path} ({exc}); continuing without it")
+    return summary, matches
 
 
 def main():
     MESHES_DIR.mkdir(parents=True, exist_ok=True)
 
+    # One session for every Allen request so keep-alive connections are reused
+    session = make_session()
+
     # 1. Load label results (mouse-only, pre-matched to Allen CCF)
     print("Step 1: Loading label results...")
-    with open(LABEL_RESULTS_PATH) as f:
-        label_data = json.load(f)
-    print(f"  {label_data['summary']['dandisets_processed']} dandisets, "
-          f"{label_data['summary']['dandisets_skipped_species']} skipped (non-mouse)")
+    label_summary, label_matches = load_label_matches(LABEL_RESULTS_PATH)
+    print(f"  {label_summary['dandisets_processed']} dandisets, "
+          f"{label_summary['dandisets_skipped_species']} skipped (non-mouse)")
 
     # 2. Download Allen structure graph
     print("Step 2: Downloading Allen structure graph...")
-    graph_data = download_json(STRUCTURE_GRAPH_URL)
+    graph_data = download_json(STRUCTURE_GRAPH_URL, session)
     structures = flatten_structure_graph(graph_data["msg"])
     print(f"  Found {len(structures)} structures in graph")
 
-    # Build lookups
+    # Build lookups in a single pass over the structures
     id_to_structure = {}
+    parent_map = {}
+    children_map = {}  # id -> [child_ids]
     for s in structures:
-        id_to_structure[s["id"]] = s
-
-    parent_map = build_parent_map(structures)
+        sid = s["id"]
+        pid = s.get("parent_structure_id")
+        id_to_structure[sid] = s
+        parent_map[sid] = pid
+        if pid is not None:
+            children_map.setdefault(pid, []).append(sid)
+    ancestors = build_ancestor_map(parent_map)
 
     # Save structure graph (the full tree for the hierarchy view)
     structure_graph_path = DATA_DIR / "structure_graph.json"
-    with open(structure_graph_path, "w") as f:
-        json.dump(graph_data["msg"], f)
+    structure_graph_path.write_bytes(orjson.dumps(graph_data["msg"]))
     print(f"  Saved structure graph to {structure_graph_path}")
 
     # 3. Aggregate label results by structure
@@ -117,39 +206,29 @@ def main():
     # structure_id -> {acronym, name, dandisets: set, file_count: int}
     region_data = {}
 
-    for result in label_data["results"]:
-        if result["status"] not in ("would_update", "updated", "no_change"):
-            continue
-        dandiset_id = result["dandiset_id"]
-        for location, matches in result.get("matched_locations", {}).items():
-            for match in matches:
-                structure_id = match["id"]
-                if structure_id not in id_to_structure:
-                    continue
-                if structure_id not in region_data:
-                    s = id_to_structure[structure_id]
-                    region_data[structure_id] = {
-                        "acronym": s["acronym"],
-                        "name": s["name"],
-                        "color_hex_triplet": s.get("color_hex_triplet", "AAAAAA"),
-                        "dandisets": set(),
-                        "file_count": 0,
-                    }
-                region_data[structure_id]["dandisets"].add(dandiset_id)
-                region_data[structure_id]["file_count"] += 1
+    # Most files repeat the same (dandiset, structure) pair. Counter tallies the
+    # pairs in C, so the Python loop below only visits each unique pair once.
+    for (dandiset_id, structure_id), n_files in Counter(label_matches).items():
+        entry = region_data.get(structure_id)
+        if entry is None:
+            s = id_to_structure.get(structure_id)
+            if s is None:
+                continue
+            entry = region_data[structure_id] = {
+                "acronym": s["acronym"],
+                "name": s["name"],
+                "color_hex_triplet": s.get("color_hex_triplet", "AAAAAA"),
+                "dandisets": set(),
+                "file_count": 0,
+            }
+        entry["dandisets"].add(dandiset_id)
+        entry["file_count"] += n_files
 
     print(f"  Matched {len(region_data)} unique CCF structures with DANDI data (mouse only)")
 
     # 4. Compute aggregate stats (descendants included) for every ancestor
     print("Step 4: Computing aggregate stats including descendants...")
 
-    # Build children map from structure graph
-    children_map = {}  # id -> [child_ids]
-    for s in structures:
-        pid = s.get("parent_structure_id")
-        if pid is not None:
-            children_map.setdefault(pid, []).append(s["id"])
-
     # For each structure, recursively collect all descendant structure IDs
     def get_all_descendants(sid):
         result = set()
@@ -162,32 +241,32 @@ def main():
         return result
 
     # Compute total (aggregate) dandisets and file counts for every node
-    # that has data itself or has any descendant with data
-    aggregate_data = {}  # structure_id -> {total_dandisets: set, total_file_count: int}
-
-    # Start with direct data
+    # that has data itself or has any descendant with data, in one pass:
+    # each structure with data adds to itself and to all of its ancestors.
+    total_dandisets = defaultdict(set)
+    total_file_count = Counter()
     for sid, data in region_data.items():
-        aggregate_data[sid] = {
-            "total_dandisets": set(data["dandisets"]),
-            "total_file_count": data["file_count"],
-        }
-
-    # Propagate upward: for each structure with data, add to all ancestors
-    for sid in list(region_data.keys()):
-        for anc_id in get_ancestors(sid, parent_map):
-            if anc_id not in aggregate_data:
-                aggregate_data[anc_id] = {
-                    "total_dandisets": set(),
-                    "total_file_count": 0,
-                }
-            aggregate_data[anc_id]["total_dandisets"].update(region_data[sid]["dandisets"])
-            aggregate_data[anc_id]["total_file_count"] += region_data[sid]["file_count"]
+        dandisets = data["dandisets"]
+        file_count = data["file_count"]
+        total_file_count[sid] += file_count
+        for anc_id in ancestors[sid]:
+            total_dandisets[anc_id] |= dandisets
+            total_file_count[anc_id] += file_count
+
+    # Add each structure's own dandisets last. Structures no descendant
+    # contributed to can then share their direct set instead of copying it,
+    # since nothing mutates the aggregate sets after this point.
+    for sid, data in region_data.items():
+        if sid in total_dandisets:
+            total_dandisets[sid] |= data["dandisets"]
+        else:
+            total_dandisets[sid] = data["dandisets"]
 
-    print(f"  {len(aggregate_data)} structures have data (direct or descendant)")
+    print(f"  {len(total_dandisets)} structures have data (direct or descendant)")
 
     # Convert to JSON-serializable output
     dandi_regions = {}
-    for sid, agg in aggregate_data.items():
+    for sid, agg_dandisets in total_dandisets.items():
         s = id_to_structure[sid]
         direct = region_data.get(sid)
         dandi_regions[str(sid)] = {
@@ -197,14 +276,14 @@ def main():
             "file_count": direct["file_count"] if direct else 0,
             "dandiset_count": len(direct["dandisets"]) if direct else 0,
             "dandisets": sorted(direct["dandisets"]) if direct else [],
-            "total_file_count": agg["total_file_count"],
-            "total_dandiset_count": len(agg["total_dandisets"]),
-            "total_dandisets": sorted(agg["total_dandisets"]),
+            "total_file_count": total_file_count[sid],
+            "total_dandiset_count": len(agg_dandisets),
+            "total_dandisets": sorted(agg_dandisets),
         }
 
     dandi_regions_path = DATA_DIR / "dandi_regions.json"
-    with open(dandi_regions_path, "w") as f:
-        json.dump(dandi_regions, f, indent=2)
+    # Compact: this file is fetched by the viewer, not read by people
+    dandi_regions_path.write_bytes(orjson.dumps(dandi_regions))
     print(f"  Saved dandi_regions.json ({len(dandi_regions)} structures)")
 
     # 5. Determine which meshes to download
@@ -214,12 +293,12 @@ def main():
     # Get ancestors for context meshes
     ancestor_ids = set()
     for sid in data_structure_ids:
-        for anc in get_ancestors(sid, parent_map):
-            ancestor_ids.add(anc)
+        ancestor_ids.update(ancestors[sid])
 
-    # Always include root brain outline (structure 997)
+    # Always include the root brain outline (the structure with no parent)
+    root_id = next(sid for sid, pid in parent_map.items() if pid is None)
     all_mesh_ids = data_structure_ids | ancestor_ids
-    all_mesh_ids.add(997)  # root brain outline
+    all_mesh_ids.add(root_id)
 
     print(
         f"  Data structures: {len(data_structure_ids)}, "
@@ -233,50 +312,60 @@ def main():
     failed = 0
     skipped = 0
     failed_ids = []
-    for i, sid in enumerate(sorted(all_mesh_ids)):
-        dest = MESHES_DIR / f"{sid}.obj"
-        if dest.exists():
+    # One directory listing instead of a stat per mesh. A mesh counts as
+    # present whether it is still an OBJ or was already converted to GLB.
+    existing = {entry.name for entry in os.scandir(MESHES_DIR)}
+    to_download = []
+    for sid in all_mesh_ids:
+        if f"{sid}.obj" in existing or f"{sid}.glb" in existing:
             skipped += 1
-            continue
-
-        url = MESH_URL_TEMPLATE.format(structure_id=sid)
-        if download_file(url, dest):
-            downloaded += 1
         else:
-            failed += 1
-            failed_ids.append(sid)
-
-        # Progress indicator
-        if (i + 1) % 50 == 0:
-            print(
-                f"  Progress: {i + 1}/{len(all_mesh_ids)} "
-                f"(downloaded: {downloaded}, skipped: {skipped}, failed: {failed})"
-            )
-
-        # Be nice to the server
-        if downloaded > 0 and downloaded % 10 == 0:
-            time.sleep(0.5)
+            to_download.append((sid, MESHES_DIR / f"{sid}.obj"))
+
+    # The session's pool size caps how many requests hit the server at once
+    def check(item):
+        sid, _ = item
+        return url_exists(MESH_URL_TEMPLATE.format(structure_id=sid), session)
+
+    def fetch(item):
+        sid, dest = item
+        return download_file(MESH_URL_TEMPLATE.format(structure_id=sid), dest, session)
+
+    with ThreadPoolExecutor(max_workers=MESH_DOWNLOAD_WORKERS) as executor:
+        # Many structures have no published mesh. A quick HEAD sweep over the
+        # pooled connections finds those before any full GET is attempted.
+        available = []
+        for item, exists in zip(to_download, executor.map(check, to_download)):
+            if exists:
+                available.append(item)
+            else:
+                failed += 1
+                failed_ids.append(item[0])
+        if failed:
+            print(f"  {failed} meshes not published, skipping")
+        to_download = available
+
+        futures = {executor.submit(fetch, item): item[0] for item in to_download}
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Meshes", unit="mesh"):
+            if future.result():
+                downloaded += 1
+            else:
+                failed += 1
+                failed_ids.append(futures[future])
 
     print(
         f"  Done: {downloaded} downloaded, {skipped} already existed, {failed} failed"
     )
 
-    # Also check for previously failed meshes (already missing on disk)
-    for sid in sorted(all_mesh_ids):
-        dest = MESHES_DIR / f"{sid}.obj"
-        if not dest.exists() and sid not in failed_ids:
-            failed_ids.append(sid)
-
     # 7. Save a mesh manifest (so the frontend knows which meshes are available)
     mesh_manifest = {
         "data_structures": sorted(data_structure_ids),
         "ancestor_structures": sorted(ancestor_ids - data_structure_ids),
         "no_mesh": sorted(failed_ids),
-        "root_id": 997,
+        "root_id": root_id,
     }
     manifest_path = DATA_DIR / "mesh_manifest.json"
-    with open(manifest_path, "w") as f:
-        json.dump(mesh_manifest, f, indent=2)
+    manifest_path.write_bytes(orjson.dumps(mesh_manifest, option=orjson.OPT_INDENT_2))
     print(f"  Saved mesh manifest to {manifest_path}")
 
     print("\nBuild complete!")
@@ -16,9 +16,9 @@ Supported atlases (share DANDI 001636):
   - MEBRAINS (EBRAINS macaque parcellation)
 
 Outputs (per atlas, under data/atlases/{atlas}/):
-  structure_graph.json, meshes/*.glb, dandiset_assets.json,
-  electrodes/001636.json, dandisets_with_electrodes.json,
-  dandi_regions.json, mesh_manifest.json
+  structure_graph.json, meshes/*.glb, assets/*.json,
+  dandisets_with_assets.json, electrodes/001636.json,
+  dandisets_with_electrodes.json, dandi_regions.json, mesh_manifest.json
 
 Usage:
     uv run python scripts/build_macaque_atlas.py --atlas d99 [--skip-meshes] [--skip-dandi]
@@ -51,7 +51,11 @@ from macaque_atlas_lib import (
     parse_mebrains_labels,
     parse_sarm_labels,
 )
-from dandi_helpers import build_dandi_regions
+from dandi_helpers import (
+    build_dandi_regions,
+    load_dandiset_assets,
+    write_dandiset_assets,
+)
 
 
 def main():
@@ -157,8 +161,7 @@ def main():
     if args.skip_dandi:
         print("Skipping DANDI data extraction; reusing existing JSON if present")
         try:
-            with open(data_dir / "dandiset_assets.json") as f:
-                dandiset_assets = json.load(f)
+            dandiset_assets = load_dandiset_assets(data_dir)
             with open(data_dir / "dandisets_with_electrodes.json") as f:
                 dandisets_with_electrodes = json.load(f)
             with open(data_dir / "dandi_regions.json") as f:
@@ -226,8 +229,7 @@ def main():
             dandiset_assets, id_to_structure, parent_map,
         )
 
-    with open(data_dir / "dandiset_assets.json", "w") as f:
-        json.dump(dandiset_assets, f)
+    write_dandiset_assets(data_dir, dandiset_assets)
 
     with open(data_dir / "dandisets_with_electrodes.json", "w") as f:
         json.dump(dandisets_with_electrodes, f)
@@ -9,13 +9,85 @@ Usage:
     python scripts/convert_meshes.py
 """
 
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import numpy as np
 import trimesh
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 MESHES_DIR = PROJECT_ROOT / "data" / "atlases" / "allen_ccf" / "meshes"
 
+_VERTEX_RE = re.compile(rb"^v ([^\n]*)", re.MULTILINE)
+_NORMAL_RE = re.compile(rb"^vn ([^\n]*)", re.MULTILINE)
+_FACE_RE = re.compile(rb"^f ([^\n]*)", re.MULTILINE)
+
+
+def _parse_numbers(chunks, dtype, ncols):
+    """Parse whitespace-separated numbers into an (N, ncols) array, or None.
+
+    Any token numpy cannot parse (e.g. an inline comment) gives None, so the
+    file goes to the trimesh fallback.
+    """
+    try:
+        values = np.fromstring(b" ".join(chunks), dtype=dtype, sep=" ")
+    except ValueError:
+        return None
+    if values.size != ncols * len(chunks):
+        return None
+    return values.reshape(-1, ncols)
+
+
+def _parse_obj(obj_path: Path):
+    """Parse a triangle-only OBJ into numpy arrays.
+
+    Allen CCF meshes contain only ``v``, ``vn`` and ``f v//vn`` lines, so the
+    numbers are converted in bulk by numpy instead of token by token. Returns
+    (vertices, faces, vertex_normals) with vertex_normals possibly None, or
+    None if the file has anything this fast path does not handle (polygons,
+    texture coordinates, normals indexed separately from vertices).
+    """
+    data = obj_path.read_bytes()
+    v_chunks = _VERTEX_RE.findall(data)
+    f_chunks = _FACE_RE.findall(data)
+    if not v_chunks or not f_chunks:
+        return None
+
+    vertices = _parse_numbers(v_chunks, np.float64, 3)
+    if vertices is None:
+        return None
+
+    normal_idx = None
+    if b"/" in b"".join(f_chunks):
+        # Only "v//vn" tokens are supported: turn them into "v vn" pairs
+        f_chunks = [chunk.replace(b"//", b" ") for chunk in f_chunks]
+        if any(b"/" in chunk for chunk in f_chunks):
+            return None
+        indices = _parse_numbers(f_chunks, np.int64, 6)
+        if indices is None:
+            return None
+        faces, normal_idx = indices[:, 0::2], indices[:, 1::2]
+    else:
+        faces = _parse_numbers(f_chunks, np.int64, 3)
+        if faces is None:
+            return None
+    if faces.min() < 1 or faces.max() > len(vertices):
+        return None
+    faces = faces - 1
+
+    normals = None
+    vn_chunks = _NORMAL_RE.findall(data)
+    if len(vn_chunks) == len(vertices):
+        normals = _parse_numbers(vn_chunks, np.float64, 3)
+    if normal_idx is not None and (
+        normals is None or not np.array_equal(normal_idx - 1, faces)
+    ):
+        return None
+
+    return vertices, faces, normals
+
 
 def convert_obj_to_glb(obj_path: Path) -> bool:
     """Convert a single OBJ file to GLB. Returns True on success."""
@@ -26,7 +98,14 @@ def convert_obj_to_glb(obj_path: Path) -> bool:
         return True
 
     try:
-        mesh = trimesh.load(obj_path, process=False)
+        parsed = _parse_obj(obj_path)
+        if parsed is None:
+            mesh = trimesh.load(obj_path, process=False)
+        else:
+            vertices, faces, normals = parsed
+            mesh = trimesh.Trimesh(
+                vertices=vertices, faces=faces, vertex_normals=normals, process=False
+            )
         mesh.export(glb_path, file_type="glb")
         return True
     except Exception as exc:
@@ -34,12 +113,25 @@ def convert_obj_to_glb(obj_path: Path) -> bool:
         return False
 
 
+def convert_objs_to_glb(obj_paths):
+    """Convert OBJ files to GLB in parallel worker processes.
+
+    Yields (obj_path, success) pairs in input order.
+    """
+    with ProcessPoolExecutor() as executor:
+        results = executor.map(convert_obj_to_glb, obj_paths, chunksize=8)
+        yield from zip(obj_paths, results)
+
+
 def main():
     if not MESHES_DIR.exists():
         print("No meshes directory found.")
         return
 
-    obj_files = sorted(MESHES_DIR.glob("*.obj"))
+    # List the directory once; DirEntry caches its stat result, so each
+    # OBJ/GLB pair is stat-ed at most once.
+    entries = {entry.name: entry for entry in os.scandir(MESHES_DIR)}
+    obj_files = sorted(MESHES_DIR / name for name in entries if name.endswith(".obj"))
     if not obj_files:
         print("No OBJ files to convert.")
         return
@@ -49,24 +141,23 @@ def main():
     skipped = 0
     failed = 0
 
+    pending = []
     for obj_path in obj_files:
-        glb_path = obj_path.with_suffix(".glb")
-        if glb_path.exists() and glb_path.stat().st_mtime >= obj_path.stat().st_mtime:
+        glb_entry = entries.get(obj_path.stem + ".glb")
+        if glb_entry and glb_entry.stat().st_mtime >= entries[obj_path.name].stat().st_mtime:
+            # Up-to-date GLB already exists; the OBJ is no longer needed
+            obj_path.unlink(missing_ok=True)
             skipped += 1
             continue
+        pending.append(obj_path)
 
-        if convert_obj_to_glb(obj_path):
-            obj_path.unlink()
+    for obj_path, ok in convert_objs_to_glb(pending):
+        if ok:
+            obj_path.unlink(missing_ok=True)
             converted += 1
         else:
             failed += 1
 
-    # Remove OBJ files that already have up-to-date GLB counterparts
-    for obj_path in MESHES_DIR.glob("*.obj"):
-        glb_path = obj_path.with_suffix(".glb")
-        if glb_path.exists():
-            obj_path.unlink()
-
     print(f"  Converted: {converted}, Skipped: {skipped}, Failed: {failed}")
 
 
@@ -5,12 +5,20 @@ and build_data.py for self-contained CI usage.
 """
 
 import ast
+import contextlib
+import functools
 import json
+import os
+import queue
 import re
+import shutil
+import threading
 import time
-import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 
 import h5py
+import numpy as np
+import orjson
 import remfile
 import requests
 from tqdm import tqdm
@@ -29,27 +37,94 @@ MESH_URL_TEMPLATE = (
     "current-release/mouse_ccf/annotation/ccf_2017/structure_meshes/{structure_id}.obj"
 )
 
-TRIVIAL_LOCATIONS = {
+TRIVIAL_LOCATIONS = frozenset({
     "unknown", "none", "", " ", "n/a", "void", "unspecific",
     "na", "not applicable", "other", "nan",
-}
+})
 
 FILTER_IDS = {997, 8}  # root, grey — not useful to display
 
+# Per-atlas dandiset assets are sharded: assets/{dandiset_id}.json plus a
+# manifest of dandiset IDs, mirroring electrodes/ and its manifest.
+ASSETS_DIRNAME = "assets"
+ASSETS_MANIFEST_FILENAME = "dandisets_with_assets.json"
+LEGACY_ASSETS_FILENAME = "dandiset_assets.json"
+
+_SES_RE = re.compile(r"_ses-([^_/]+)")
+_DESC_RE = re.compile(r"_desc-([^_/]+)")
+_NWB_SUFFIX_RE = re.compile(r"\.nwb$")
+_PROCESSED_SUFFIX_RE = re.compile(r"-processed-only$")
+_AREA_RE = re.compile(r"area:\s*([^,]+)")
+
 MAX_RETRIES = 3
 RETRY_BACKOFF = 2  # seconds, multiplied by attempt number
 
+# Connections kept open to the DANDI API; covers the asset workers plus the
+# listing prefetch thread.
+API_POOL_SIZE = 32
+
+# Dandiset listing pages fetched ahead of the consumer
+LISTING_PREFETCH_PAGES = 2
+
+# Meshes are served over plain http, where clients only speak HTTP/1.1 (no
+# h2c upgrade), so concurrency comes from a pool of keep-alive connections
+# rather than HTTP/2 multiplexing.
+MESH_DOWNLOAD_WORKERS = 12
+MESH_COPY_BUFFER_SIZE = 1024 * 1024
+
+# NWB streaming: remfile fetches at least this many bytes per HTTP range
+# request (its default is 100 KB), so HDF5 metadata and the small electrode
+# columns arrive in a handful of round trips instead of dozens.
+REMFILE_MIN_CHUNK_SIZE = 4 * 1024 * 1024
+# h5py raw-data chunk cache, large enough that the x/y/z electrode columns
+# reuse already-fetched chunks.
+H5_CHUNK_CACHE_BYTES = 16 * 1024 * 1024
+
 # Allen CCF bounds (micrometers) for electrode validation
 ALLEN_X_MAX = 13200
 ALLEN_Y_MAX = 8000
 ALLEN_Z_MAX = 11400
 
 
+# ---------------------------------------------------------------------------
+# JSON file helpers
+# ---------------------------------------------------------------------------
+
+
+def load_json(path):
+    """Read and parse a JSON file in one read with orjson."""
+    with open(path, "rb") as f:
+        return orjson.loads(f.read())
+
+
+def dump_json(path, obj, indent=False):
+    """Write obj to path as compact JSON, or 2-space indented if indent."""
+    with open(path, "wb") as f:
+        f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0))
+
+
 # ---------------------------------------------------------------------------
 # DANDI API helpers
 # ---------------------------------------------------------------------------
 
 
+def _make_pooled_session(pool_size):
+    """Create a requests.Session that keeps up to pool_size connections per host."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Shared by all API calls so worker threads reuse open connections instead of
+# repeating the TCP + TLS handshake on every request.
+_SESSION = _make_pooled_session(API_POOL_SIZE)
+
+
 def _request_with_retry(method, url, **kwargs):
     """Make an HTTP request with retry on 429 and 5xx errors."""
     resp = None
@@ -74,15 +149,23 @@ def _request_with_retry(method, url, **kwargs):
 
 
 def check_species_mouse(dandiset_id):
-    """Check if a dandiset's assetsSummary.species includes Mus musculus."""
+    """Check if a dandiset's assetsSummary.species includes Mus musculus.
+
+    A missing dandiset (404) is not mouse; any other failed request raises
+    requests.HTTPError so the caller can tell it apart from a real answer.
+    """
     url = f"{DANDI_API}/dandisets/{dandiset_id}/versions/draft/"
-    resp = _request_with_retry(requests.get, url, timeout=30)
-    if resp.status_code != 200:
+    resp = _request_with_retry(_SESSION.get, url, timeout=30)
+    if resp.status_code == 404:
         return False
+    if resp.status_code != 200:
+        raise requests.HTTPError(
+            f"Species check for {dandiset_id} failed with {resp.status_code}",
+            response=resp,
+        )
     data = resp.json()
     assets_summary = data.get("metadata", data).get("assetsSummary", {})
-    species = assets_summary.get("species", [])
-    for sp in species:
+    for sp in assets_summary.get("species", []):
         identifier = sp.get("identifier", "")
         if "NCBITaxon_10090" in identifier or "10090" in identifier:
             return True
@@ -113,7 +196,7 @@ def get_dandiset_species(dandiset_id):
      "identifier": "http://purl.obolibrary.org/obo/NCBITaxon_9544"}).
     """
     url = f"{DANDI_API}/dandisets/{dandiset_id}/versions/draft/"
-    resp = _request_with_retry(requests.get, url, timeout=30)
+    resp = _request_with_retry(_SESSION.get, url, timeout=30)
     if resp.status_code != 200:
         return []
     data = resp.json()
@@ -138,16 +221,25 @@ def check_species_macaque(dandiset_id):
     return False
 
 
-def get_nwb_assets_paged(dandiset_id, version="draft", max_assets=None):
-    """Yield NWB asset dicts for a dandiset, with pagination."""
+def get_nwb_assets_paged(dandiset_id, version="draft", max_assets=None, strict=False):
+    """Yield NWB asset dicts for a dandiset, with pagination.
+
+    A failed page request ends the listing early; with strict=True it raises
+    requests.HTTPError instead, so callers can tell a partial listing apart.
+    """
     url = (
         f"{DANDI_API}/dandisets/{dandiset_id}/versions/{version}"
         f"/assets/?page_size=100&glob=*.nwb"
     )
     count = 0
     while url:
-        resp = _request_with_retry(requests.get, url, timeout=30)
+        resp = _request_with_retry(_SESSION.get, url, timeout=30)
         if resp.status_code != 200:
+            if strict:
+                raise requests.HTTPError(
+                    f"Asset listing for {dandiset_id} failed with {resp.status_code}",
+                    response=resp,
+                )
             break
         data = resp.json()
         for asset in data["results"]:
@@ -167,6 +259,58 @@ def get_download_url(dandiset_id, asset_id, version="draft"):
     )
 
 
+_PAGES_DONE = object()
+
+
+def _iter_listing_pages(url, is_last_page=None):
+    """Yield the `results` list of each page of a paginated DANDI listing.
+
+    A background thread fetches up to LISTING_PREFETCH_PAGES pages ahead
+    while the caller works through the current one. Errors from the fetcher
+    are re-raised in the caller, and closing the generator stops the fetcher.
+    If is_last_page(results) is true for a page, nothing past it is fetched,
+    so a caller that stops at a cutoff does not pay for prefetched pages.
+    """
+    pages = queue.Queue(maxsize=LISTING_PREFETCH_PAGES)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def fetch():
+        next_url = url
+        try:
+            while next_url and not stop.is_set():
+                resp = _request_with_retry(_SESSION.get, next_url, timeout=30)
+                resp.raise_for_status()
+                data = resp.json()
+                next_url = data.get("next")
+                if is_last_page is not None and is_last_page(data["results"]):
+                    next_url = None
+                put(data["results"])
+        except Exception as exc:
+            put(exc)
+        else:
+            put(_PAGES_DONE)
+
+    threading.Thread(target=fetch, daemon=True).start()
+    try:
+        while True:
+            item = pages.get()
+            if item is _PAGES_DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
 def iter_dandisets_modified_since(since_iso):
     """Yield dandiset metadata dicts modified after the given ISO timestamp.
 
@@ -174,27 +318,25 @@ def iter_dandisets_modified_since(since_iso):
     once a dandiset older than the cutoff is encountered.
     """
     url = f"{DANDI_API}/dandisets/?page_size=200&ordering=-modified"
-    while url:
-        resp = _request_with_retry(requests.get, url, timeout=30)
-        resp.raise_for_status()
-        data = resp.json()
-        for ds in data["results"]:
-            modified = ds.get("modified", "")
-            if modified <= since_iso:
-                return
-            yield ds
-        url = data.get("next")
+
+    def reaches_cutoff(results):
+        return any(ds.get("modified", "") <= since_iso for ds in results)
+
+    with contextlib.closing(_iter_listing_pages(url, reaches_cutoff)) as pages:
+        for results in pages:
+            for ds in results:
+                modified = ds.get("modified", "")
+                if modified <= since_iso:
+                    return
+                yield ds
 
 
 def iter_all_dandisets():
     """Yield all dandiset metadata dicts from the DANDI API."""
     url = f"{DANDI_API}/dandisets/?page_size=200&ordering=-modified"
-    while url:
-        resp = _request_with_retry(requests.get, url, timeout=30)
-        resp.raise_for_status()
-        data = resp.json()
-        yield from data["results"]
-        url = data.get("next")
+    with contextlib.closing(_iter_listing_pages(url)) as pages:
+        for results in pages:
+            yield from results
 
 
 # ---------------------------------------------------------------------------
@@ -215,8 +357,20 @@ def _read_scalar_or_array(dataset):
     return [raw]
 
 
-def extract_locations(url):
-    """Open an NWB file via HTTP streaming and return location values.
+@contextlib.contextmanager
+def open_nwb(url):
+    """Open an NWB file via HTTP streaming and yield the h5py.File.
+
+    Open each asset once and pass the file to extract_locations and
+    extract_electrode_coords, so the HDF5 metadata is only fetched once.
+    """
+    rf = remfile.File(url, _min_chunk_size=REMFILE_MIN_CHUNK_SIZE)
+    with h5py.File(rf, "r", rdcc_nbytes=H5_CHUNK_CACHE_BYTES) as f:
+        yield f
+
+
+def extract_locations(f):
+    """Return location values from an open NWB file (see open_nwb).
 
     Returns (imaging_locations, electrode_locations, icephys_locations).
     """
@@ -224,66 +378,85 @@ def extract_locations(url):
     electrode_locations = []
     icephys_locations = []
 
-    rf = remfile.File(url)
-    with h5py.File(rf, "r") as f:
-        # ImagingPlane objects
-        if "general/optophysiology" in f:
-            opto = f["general/optophysiology"]
-            for name in opto:
-                plane = opto[name]
-                if isinstance(plane, h5py.Group) and "location" in plane:
-                    val = plane["location"][()]
-                    if isinstance(val, bytes):
-                        val = val.decode("utf-8", errors="replace")
-                    imaging_locations.append(val)
-
-        # Extracellular electrodes table
-        if "general/extracellular_ephys/electrodes" in f:
-            electrodes = f["general/extracellular_ephys/electrodes"]
-            if "location" in electrodes:
-                electrode_locations = _read_scalar_or_array(electrodes["location"])
-
-        # IntracellularElectrode objects
-        if "general/intracellular_ephys" in f:
-            icephys = f["general/intracellular_ephys"]
-            for name in icephys:
-                item = icephys[name]
-                if isinstance(item, h5py.Group) and "location" in item:
-                    val = item["location"][()]
-                    if isinstance(val, bytes):
-                        val = val.decode("utf-8", errors="replace")
-                    icephys_locations.append(val)
+    # ImagingPlane objects
+    if "general/optophysiology" in f:
+        opto = f["general/optophysiology"]
+        for name in opto:
+            plane = opto[name]
+            if isinstance(plane, h5py.Group) and "location" in plane:
+                val = plane["location"][()]
+                if isinstance(val, bytes):
+                    val = val.decode("utf-8", errors="replace")
+                imaging_locations.append(val)
+
+    # Extracellular electrodes table
+    if "general/extracellular_ephys/electrodes" in f:
+        electrodes = f["general/extracellular_ephys/electrodes"]
+        if "location" in electrodes:
+            electrode_locations = _read_scalar_or_array(electrodes["location"])
+
+    # IntracellularElectrode objects
+    if "general/intracellular_ephys" in f:
+        icephys = f["general/intracellular_ephys"]
+        for name in icephys:
+            item = icephys[name]
+            if isinstance(item, h5py.Group) and "location" in item:
+                val = item["location"][()]
+                if isinstance(val, bytes):
+                    val = val.decode("utf-8", errors="replace")
+                icephys_locations.append(val)
 
     return imaging_locations, electrode_locations, icephys_locations
 
 
-def extract_electrode_coords(url):
-    """Open an NWB file via HTTP streaming and return electrode x,y,z coords.
+def _read_column(dataset):
+    """Read a numeric electrode column into a NumPy array.
 
-    Returns list of [x, y, z] or None if no electrode coordinates found.
+    An unfiltered dataset stored as a single chunk is fetched as one raw
+    chunk; anything else is read straight into a preallocated array.
     """
-    rf = remfile.File(url)
-    with h5py.File(rf, "r") as f:
-        if "general/extracellular_ephys/electrodes" not in f:
-            return None
-        electrodes = f["general/extracellular_ephys/electrodes"]
-        if not all(col in electrodes for col in ("x", "y", "z")):
-            return None
+    if dataset.dtype.kind not in "fiu":
+        return dataset[()]
+    shape = dataset.shape
+    if (
+        len(shape) == 1
+        and shape[0]
+        and dataset.chunks == shape
+        and dataset.id.get_create_plist().get_nfilters() == 0
+        # An unwritten chunk has no storage; read_direct returns fill values
+        and dataset.id.get_storage_size() == dataset.nbytes
+    ):
+        _, buf = dataset.id.read_direct_chunk((0,))
+        return np.frombuffer(buf, dtype=dataset.dtype, count=shape[0])
+    out = np.empty(shape, dtype=dataset.dtype)
+    if out.size:
+        dataset.read_direct(out)
+    return out
+
+
+def extract_electrode_coords(f):
+    """Return electrode x,y,z coords from an open NWB file (see open_nwb).
 
-        x = electrodes["x"][()]
-        y = electrodes["y"][()]
-        z = electrodes["z"][()]
+    Returns list of [x, y, z] or None if no electrode coordinates found.
+    """
+    if "general/extracellular_ephys/electrodes" not in f:
+        return None
+    electrodes = f["general/extracellular_ephys/electrodes"]
+    if not all(col in electrodes for col in ("x", "y", "z")):
+        return None
 
-    coords = []
-    for xi, yi, zi in zip(x, y, z):
-        xi, yi, zi = float(xi), float(yi), float(zi)
-        # Skip NaN values
-        if xi != xi or yi != yi or zi != zi:
-            continue
-        coords.append([round(xi, 1), round(yi, 1), round(zi, 1)])
+    x = _read_column(electrodes["x"])
+    y = _read_column(electrodes["y"])
+    z = _read_column(electrodes["z"])
 
+    xyz = np.column_stack([x, y, z]).astype(np.float64, copy=False)
+    # Skip electrodes with any NaN coordinate. Rounding uses Python's round(),
+    # which differs from np.round at half-way values, to keep output stable.
+    rows = xyz[~np.isnan(xyz).any(axis=1)].tolist()
+    coords = [[round(v, 1) for v in row] for row in rows]
     if not coords:
         return None
+    xyz = np.array(coords)
 
     # Filter out non-atlas coordinates. Many NWB files store probe-relative
     # positions or placeholders instead of Allen CCF coordinates. Valid CCF
@@ -291,18 +464,17 @@ def extract_electrode_coords(url):
     # electrode position should have at least 2 axes with |value| > 1000.
     # Some files use 10 µm voxel units (max ~1320); for those, require
     # at least 2 axes with |median| > 100.
-    xs = sorted(abs(c[0]) for c in coords)
-    ys = sorted(abs(c[1]) for c in coords)
-    zs = sorted(abs(c[2]) for c in coords)
-    med = [xs[len(xs) // 2], ys[len(ys) // 2], zs[len(zs) // 2]]
-    max_val = max(xs[-1], ys[-1], zs[-1])
+    abs_xyz = np.abs(xyz)
+    # Upper median per axis (element n // 2 of the sorted column)
+    med = np.partition(abs_xyz, len(abs_xyz) // 2, axis=0)[len(abs_xyz) // 2]
+    max_val = abs_xyz.max()
     if max_val > 1500:
         # Likely µm: require 2 axes with median > 1000
-        if sum(1 for m in med if m > 1000) < 2:
+        if np.count_nonzero(med > 1000) < 2:
             return None
     else:
         # Likely 10 µm voxel units: require 2 axes with median > 100
-        if sum(1 for m in med if m > 100) < 2:
+        if np.count_nonzero(med > 100) < 2:
             return None
 
     return coords
@@ -316,18 +488,22 @@ def extract_electrode_coords(url):
 def fetch_allen_structure_graph():
     """Download the Allen CCF structure graph and return the raw message list."""
     print("Fetching Allen CCF structure graph...")
-    resp = requests.get(ALLEN_STRUCTURE_GRAPH_URL, timeout=60)
+    resp = _SESSION.get(ALLEN_STRUCTURE_GRAPH_URL, timeout=60)
     resp.raise_for_status()
-    return resp.json()["msg"]
+    # json.loads accepts the raw UTF-8 bytes, skipping an intermediate str copy
+    return json.loads(resp.content)["msg"]
 
 
 def flatten_structure_graph(msg):
-    """Recursively flatten the Allen structure graph tree into a flat list."""
+    """Flatten the Allen structure graph tree into a flat list (pre-order)."""
     result = []
-    for node in msg:
+    stack = list(reversed(msg))
+    while stack:
+        node = stack.pop()
         result.append(node)
-        if node.get("children"):
-            result.extend(flatten_structure_graph(node["children"]))
+        children = node.get("children")
+        if children:
+            stack.extend(reversed(children))
     return result
 
 
@@ -369,6 +545,27 @@ def get_ancestors(structure_id, parent_map):
     return ancestors
 
 
+def precompute_ancestors(parent_map):
+    """Build a table of structure_id -> tuple of ancestor IDs (nearest first).
+
+    Each chain extends its parent's already-computed tuple, so the tree is
+    walked once; pass the result to build_dandi_regions and compute_mesh_set.
+    """
+    ancestors = {}
+    for sid in parent_map:
+        # Climb to the nearest structure whose chain is already known
+        path = []
+        current = sid
+        while current is not None and current not in ancestors:
+            path.append(current)
+            current = parent_map.get(current)
+        chain = () if current is None else (current,) + ancestors[current]
+        for node in reversed(path):
+            ancestors[node] = chain
+            chain = (node,) + chain
+    return ancestors
+
+
 # ---------------------------------------------------------------------------
 # Location matching
 # ---------------------------------------------------------------------------
@@ -386,25 +583,21 @@ def _extract_area(location):
             pass
 
     # Comma-separated key: value pairs: area: VISp,depth: 175
-    m = re.match(r"area:\s*([^,]+)", location)
+    m = _AREA_RE.match(location)
     if m:
         return m.group(1).strip()
 
     return None
 
 
-def _match_single(loc, by_acronym, by_name, by_acronym_lower, by_name_lower):
-    """Match a single token against Allen CCF structures."""
-    if loc in by_acronym:
-        return by_acronym[loc]
-    if loc in by_name:
-        return by_name[loc]
-    loc_lower = loc.lower()
-    if loc_lower in by_acronym_lower:
-        return by_acronym_lower[loc_lower]
-    if loc_lower in by_name_lower:
-        return by_name_lower[loc_lower]
-    return None
+def _match_single(loc, loc_lower, by_acronym, by_name, by_acronym_lower, by_name_lower):
+    """Match a single token (given with its lowercased form) against Allen CCF structures."""
+    return (
+        by_acronym.get(loc)
+        or by_name.get(loc)
+        or by_acronym_lower.get(loc_lower)
+        or by_name_lower.get(loc_lower)
+    )
 
 
 def match_location(location, lookups):
@@ -416,13 +609,13 @@ def match_location(location, lookups):
 
     Returns a list of matched structure dicts (may be empty).
     """
-    by_acronym, by_name, by_acronym_lower, by_name_lower = lookups
     loc = location.strip()
-    if loc.lower() in TRIVIAL_LOCATIONS:
+    loc_lower = loc.lower()
+    if loc_lower in TRIVIAL_LOCATIONS:
         return []
 
     # Try as a single value first
-    result = _match_single(loc, by_acronym, by_name, by_acronym_lower, by_name_lower)
+    result = _match_single(loc, loc_lower, *lookups)
     if result:
         return [result]
 
@@ -433,11 +626,12 @@ def match_location(location, lookups):
 
     # Try comma-separated list (e.g. "VISp,VISrl,VISlm,VISal")
     if "," in loc:
-        parts = [p.strip() for p in loc.split(",")]
         matches = []
-        for part in parts:
-            if part and part.lower() not in TRIVIAL_LOCATIONS:
-                s = _match_single(part, by_acronym, by_name, by_acronym_lower, by_name_lower)
+        for part in loc.split(","):
+            part = part.strip()
+            part_lower = part.lower()
+            if part and part_lower not in TRIVIAL_LOCATIONS:
+                s = _match_single(part, part_lower, *lookups)
                 if s:
                     matches.append(s)
         if matches:
@@ -451,32 +645,35 @@ def match_location(location, lookups):
 # ---------------------------------------------------------------------------
 
 
+# The same asset paths are parsed while grouping, processing and building the
+# output, so the filename parsers are memoized per path.
+@functools.lru_cache(maxsize=65536)
 def extract_subject(path):
     """Extract subject directory from asset path."""
     parts = path.split("/")
     return parts[0] if len(parts) > 1 else path.split("_")[0]
 
 
+@functools.lru_cache(maxsize=65536)
 def extract_session(path):
     """Extract session ID from a BIDS-style NWB filename.
 
     Strips known non-standard suffixes like '-processed-only' that some
     datasets (e.g., IBL) append to the session UUID without an underscore.
     """
-    import re
-    match = re.search(r"_ses-([^_/]+)", path)
+    match = _SES_RE.search(path)
     if not match:
         return None
     session = match.group(1)
-    session = re.sub(r"\.nwb$", "", session)
-    session = re.sub(r"-processed-only$", "", session)
+    session = _NWB_SUFFIX_RE.sub("", session)
+    session = _PROCESSED_SUFFIX_RE.sub("", session)
     return session
 
 
+@functools.lru_cache(maxsize=65536)
 def extract_desc(path):
     """Extract description label from a BIDS-style NWB filename."""
-    import re
-    match = re.search(r"_desc-([^_/]+)", path)
+    match = _DESC_RE.search(path)
     return match.group(1) if match else None
 
 
@@ -485,115 +682,194 @@ def extract_desc(path):
 # ---------------------------------------------------------------------------
 
 
-def build_dandi_regions(dandiset_assets, id_to_structure, parent_map):
+def build_dandi_regions(dandiset_assets, id_to_structure, parent_map, ancestors=None):
     """Build dandi_regions dict from dandiset_assets.
 
-    Aggregates per-structure counts and propagates to ancestors.
-    Returns a dict of structure_id_str -> region info.
+    Aggregates per-structure counts and propagates to ancestors, using the
+    precompute_ancestors table if given. Returns a dict of structure_id_str
+    -> region info.
     """
-    # Direct counts: structure_id -> {dandisets: set, file_count: int}
-    region_data = {}
+    # Dandiset sets are bitmasks over the sorted dandiset IDs: bit i stands
+    # for dandiset_ids[i], so propagating to ancestors is an integer OR.
+    dandiset_ids = sorted(dandiset_assets)
+    dandiset_bit = {did: 1 << i for i, did in enumerate(dandiset_ids)}
+
+    # Direct counts: structure_id -> dandiset mask / file count
+    region_masks = {}
+    region_counts = {}
 
     for dandiset_id, assets in dandiset_assets.items():
+        bit = dandiset_bit[dandiset_id]
         for asset in assets:
             for r in asset.get("regions", []):
                 sid = r["id"]
                 if sid not in id_to_structure:
                     continue
-                if sid not in region_data:
-                    region_data[sid] = {"dandisets": set(), "file_count": 0}
-                region_data[sid]["dandisets"].add(dandiset_id)
-                region_data[sid]["file_count"] += 1
-
-    # Build children map
-    children_map = {}
-    for s in id_to_structure.values():
-        pid = s.get("parent_structure_id")
-        if pid is not None:
-            children_map.setdefault(pid, []).append(s["id"])
+                region_masks[sid] = region_masks.get(sid, 0) | bit
+                region_counts[sid] = region_counts.get(sid, 0) + 1
 
     # Aggregate: propagate upward to ancestors
-    aggregate_data = {}
-    for sid, data in region_data.items():
-        aggregate_data[sid] = {
-            "total_dandisets": set(data["dandisets"]),
-            "total_file_count": data["file_count"],
-        }
-
-    for sid in list(region_data.keys()):
-        for anc_id in get_ancestors(sid, parent_map):
-            if anc_id not in aggregate_data:
-                aggregate_data[anc_id] = {
-                    "total_dandisets": set(),
-                    "total_file_count": 0,
-                }
-            aggregate_data[anc_id]["total_dandisets"].update(region_data[sid]["dandisets"])
-            aggregate_data[anc_id]["total_file_count"] += region_data[sid]["file_count"]
+    total_masks = dict(region_masks)
+    total_counts = dict(region_counts)
+    if ancestors is None:
+        ancestors = precompute_ancestors(parent_map)
+    for sid, mask in region_masks.items():
+        count = region_counts[sid]
+        for anc_id in ancestors.get(sid, ()):
+            total_masks[anc_id] = total_masks.get(anc_id, 0) | mask
+            total_counts[anc_id] = total_counts.get(anc_id, 0) + count
+
+    def decode(mask):
+        """Return the sorted dandiset IDs whose bits are set in mask."""
+        ids = []
+        while mask:
+            low = mask & -mask
+            ids.append(dandiset_ids[low.bit_length() - 1])
+            mask ^= low
+        return ids
 
     # Convert to JSON-serializable output
     dandi_regions = {}
-    for sid, agg in aggregate_data.items():
+    for sid, total_mask in total_masks.items():
         s = id_to_structure[sid]
-        direct = region_data.get(sid)
+        direct = decode(region_masks.get(sid, 0))
+        total = decode(total_mask)
         dandi_regions[str(sid)] = {
             "acronym": s["acronym"],
             "name": s["name"],
             "color_hex_triplet": s.get("color_hex_triplet", "AAAAAA"),
-            "file_count": direct["file_count"] if direct else 0,
-            "dandiset_count": len(direct["dandisets"]) if direct else 0,
-            "dandisets": sorted(direct["dandisets"]) if direct else [],
-            "total_file_count": agg["total_file_count"],
-            "total_dandiset_count": len(agg["total_dandisets"]),
-            "total_dandisets": sorted(agg["total_dandisets"]),
+            "file_count": region_counts.get(sid, 0),
+            "dandiset_count": len(direct),
+            "dandisets": direct,
+            "total_file_count": total_counts[sid],
+            "total_dandiset_count": len(total),
+            "total_dandisets": total,
         }
 
     return dandi_regions
 
 
-def compute_mesh_set(dandi_regions, parent_map):
+def write_dandiset_assets(data_dir, dandiset_assets, changed=None):
+    """Write dandiset assets as one assets/{dandiset_id}.json file per dandiset.
+
+    Also writes the manifest the viewer uses to know which dandisets have
+    assets, and removes shards of dandisets no longer present along with the
+    old single-file dandiset_assets.json. If `changed` is given, only those
+    dandisets (and any without a shard yet) are rewritten.
+
+    Shards are written first, then the manifest is swapped in atomically, and
+    only then are stale files removed, so an interrupted run never leaves the
+    manifest listing a shard that does not exist.
+
+    Returns the number of shard files written.
+    """
+    assets_dir = data_dir / ASSETS_DIRNAME
+    assets_dir.mkdir(parents=True, exist_ok=True)
+
+    written = 0
+    for dandiset_id, assets in dandiset_assets.items():
+        path = assets_dir / f"{dandiset_id}.json"
+        if changed is not None and dandiset_id not in changed and path.exists():
+            continue
+        dump_json(path, assets)
+        written += 1
+
+    manifest_path = data_dir / ASSETS_MANIFEST_FILENAME
+    tmp_path = manifest_path.with_suffix(".json.tmp")
+    dump_json(tmp_path, sorted(dandiset_assets))
+    os.replace(tmp_path, manifest_path)
+
+    for path in assets_dir.glob("*.json"):
+        if path.stem not in dandiset_assets:
+            path.unlink()
+    (data_dir / LEGACY_ASSETS_FILENAME).unlink(missing_ok=True)
+    return written
+
+
+def load_dandiset_assets(data_dir):
+    """Load dandiset_id -> assets from the shards written by write_dandiset_assets.
+
+    Falls back to a pre-sharding dandiset_assets.json. Raises
+    FileNotFoundError only if neither is present; a shard listed in the
+    manifest but missing on disk raises RuntimeError, so callers never
+    mistake a damaged atlas for an empty one.
+    """
+    manifest_path = data_dir / ASSETS_MANIFEST_FILENAME
+    legacy_path = data_dir / LEGACY_ASSETS_FILENAME
+    if not manifest_path.exists():
+        if legacy_path.exists():
+            return load_json(legacy_path)
+        raise FileNotFoundError(
+            f"No {ASSETS_MANIFEST_FILENAME} or {LEGACY_ASSETS_FILENAME} in {data_dir}"
+        )
+
+    assets_dir = data_dir / ASSETS_DIRNAME
+    result = {}
+    for dandiset_id in load_json(manifest_path):
+        path = assets_dir / f"{dandiset_id}.json"
+        if not path.exists():
+            raise RuntimeError(f"{path} is listed in {manifest_path} but missing")
+        result[dandiset_id] = load_json(path)
+    return result
+
+
+def compute_mesh_set(dandi_regions, parent_map, ancestors=None):
     """Determine which mesh IDs are needed.
 
     Returns (data_ids, ancestor_ids, all_ids).
     """
     data_ids = set(int(sid) for sid in dandi_regions.keys())
+    if ancestors is None:
+        ancestors = precompute_ancestors(parent_map)
     ancestor_ids = set()
     for sid in data_ids:
-        for anc in get_ancestors(sid, parent_map):
-            ancestor_ids.add(anc)
+        ancestor_ids.update(ancestors.get(sid, ()))
 
     all_ids = data_ids | ancestor_ids
     all_ids.add(997)  # root brain outline
     return data_ids, ancestor_ids, all_ids
 
 
+def _make_mesh_session():
+    """Create a session whose connection pool covers every download worker."""
+    session = _make_pooled_session(MESH_DOWNLOAD_WORKERS)
+    session.headers["User-Agent"] = "brain-atlas-viewer/1.0"
+    return session
+
+
 def download_meshes(mesh_ids, meshes_dir):
     """Download OBJ meshes for the given structure IDs.
 
     Returns list of IDs that failed to download.
     """
     meshes_dir.mkdir(parents=True, exist_ok=True)
-    failed_ids = []
-    downloaded = 0
+    pending = [
+        sid for sid in sorted(mesh_ids)
+        if not (meshes_dir / f"{sid}.obj").exists()
+    ]
+    session = _make_mesh_session()
 
-    for i, sid in enumerate(sorted(mesh_ids)):
+    def fetch(sid):
         dest = meshes_dir / f"{sid}.obj"
-        if dest.exists():
-            continue
-
+        tmp = dest.with_name(dest.name + ".part")
         url = MESH_URL_TEMPLATE.format(structure_id=sid)
         try:
-            req = urllib.request.Request(
-                url, headers={"User-Agent": "brain-atlas-viewer/1.0"}
-            )
-            with urllib.request.urlopen(req, timeout=60) as resp:
-                dest.write_bytes(resp.read())
-            downloaded += 1
+            resp = _request_with_retry(session.get, url, timeout=60, stream=True)
+            with resp:
+                resp.raise_for_status()
+                resp.raw.decode_content = True
+                with open(tmp, "wb") as f:
+                    shutil.copyfileobj(resp.raw, f, length=MESH_COPY_BUFFER_SIZE)
+            tmp.replace(dest)
+            return True
         except Exception as e:
-            print(f"  Failed to download mesh {sid}: {e}")
-            failed_ids.append(sid)
+            tmp.unlink(missing_ok=True)
+            tqdm.write(f"  Failed to download mesh {sid}: {e}")
+            return False
 
-        if downloaded > 0 and downloaded % 10 == 0:
-            time.sleep(0.5)
+    with ThreadPoolExecutor(max_workers=MESH_DOWNLOAD_WORKERS) as executor:
+        results = executor.map(fetch, pending)
+        failed_ids = [sid for sid, ok in zip(pending, results) if not ok]
 
     # Check for any missing meshes
     for sid in sorted(mesh_ids):
@@ -1,23 +1,30 @@
-"""Convert label_cache.jsonl to compact dandiset_assets.json for the viewer.
+"""Convert label_cache.jsonl to compact per-dandiset asset files for the viewer.
 
 Keeps all assets per subject per dandiset, sorted by path, with session and
 description metadata extracted from BIDS filenames.
 """
 
-import json
 import os
 import re
-from collections import defaultdict
 from pathlib import Path
 
+import orjson
+
+from dandi_helpers import write_dandiset_assets
+
 LABEL_CACHE = Path(os.environ.get(
     "LABEL_CACHE",
     os.path.expanduser("~/dev/sandbox/analyze-locations/label_cache.jsonl"),
 ))
-OUTPUT = Path(__file__).resolve().parent.parent / "data" / "atlases" / "allen_ccf" / "dandiset_assets.json"
+OUTPUT = Path(__file__).resolve().parent.parent / "data" / "atlases" / "allen_ccf"
 
 FILTER_IDS = {997, 8}  # root, grey (not useful to display)
 
+_SES_RE = re.compile(r"_ses-([^_/]+)")
+_DESC_RE = re.compile(r"_desc-([^_/]+)")
+_NWB_SUFFIX_RE = re.compile(r"\.nwb$")
+_PROCESSED_SUFFIX_RE = re.compile(r"-processed-only$")
+
 
 def extract_subject(path):
     """Extract subject directory from asset path."""
@@ -27,87 +34,82 @@ def extract_subject(path):
 
 def extract_session(path):
     """Extract session ID from a BIDS-style NWB filename."""
-    match = re.search(r"_ses-([^_/]+)", path)
+    match = _SES_RE.search(path)
     if not match:
         return None
     session = match.group(1)
-    session = re.sub(r"\.nwb$", "", session)
-    session = re.sub(r"-processed-only$", "", session)
+    session = _NWB_SUFFIX_RE.sub("", session)
+    session = _PROCESSED_SUFFIX_RE.sub("", session)
     return session
 
 
 def extract_desc(path):
     """Extract description label from a BIDS-style NWB filename."""
-    match = re.search(r"_desc-([^_/]+)", path)
+    match = _DESC_RE.search(path)
     return match.group(1) if match else None
 
 
 def main():
-    # dandiset -> subject -> list of assets
-    dandisets = defaultdict(lambda: defaultdict(list))
-
-    with open(LABEL_CACHE) as f:
+    # One row per asset, stored as parallel columns. Region dicts are
+    # interned in regions_pool and each row keeps indices into it.
+    dids, subjects, paths, asset_ids = [], [], [], []
+    sessions, descs, region_rows = [], [], []
+    regions_pool = []
+    region_index = {}  # (id, acronym, name) -> index into regions_pool
+
+    with open(LABEL_CACHE, "rb") as f:
         for line in f:
-            entry = json.loads(line)
-            did = entry["dandiset_id"]
-            asset_id = entry["asset_id"]
+            entry = orjson.loads(line)
             path = entry["path"]
             matched = entry.get("matched_locations", {})
 
-            regions = []
-            for loc_key, matches in matched.items():
+            # Region id -> pool index, first match per id wins (dicts keep
+            # insertion order, so the row order is the match order)
+            row = {}
+            for matches in matched.values():
                 for m in matches:
-                    if m["id"] not in FILTER_IDS:
-                        regions.append({
-                            "id": m["id"],
-                            "acronym": m["acronym"],
-                            "name": m["name"],
-                        })
-
-            # Deduplicate by id
-            seen = set()
-            unique_regions = []
-            for r in regions:
-                if r["id"] not in seen:
-                    seen.add(r["id"])
-                    unique_regions.append(r)
-
-            subject = extract_subject(path)
-            asset_entry = {
-                "path": path,
-                "asset_id": asset_id,
-                "regions": unique_regions,
-            }
-
-            session = extract_session(path)
-            if session:
-                asset_entry["session"] = session
-
-            desc = extract_desc(path)
-            if desc:
-                asset_entry["desc"] = desc
-
-            dandisets[did][subject].append(asset_entry)
+                    mid = m["id"]
+                    if mid in FILTER_IDS or mid in row:
+                        continue
+                    key = (mid, m["acronym"], m["name"])
+                    idx = region_index.get(key)
+                    if idx is None:
+                        idx = region_index[key] = len(regions_pool)
+                        regions_pool.append(
+                            {"id": mid, "acronym": key[1], "name": key[2]}
+                        )
+                    row[mid] = idx
+
+            dids.append(entry["dandiset_id"])
+            subjects.append(extract_subject(path))
+            paths.append(path)
+            asset_ids.append(entry["asset_id"])
+            sessions.append(extract_session(path))
+            descs.append(extract_desc(path))
+            region_rows.append(list(row.values()))
 
     # Keep ALL assets per subject, sorted by path
-    result = {}
-    for did in sorted(dandisets):
-        subjects = dandisets[did]
-        assets = []
-        for subj in sorted(subjects):
-            sorted_assets = sorted(subjects[subj], key=lambda a: a["path"])
-            assets.extend(sorted_assets)
-        result[did] = assets
-
-    with open(OUTPUT, "w") as f:
-        json.dump(result, f, separators=(",", ":"))
-
-    total_assets = sum(len(v) for v in result.values())
-    total_subjects = sum(
-        len(set(extract_subject(a["path"]) for a in assets))
-        for assets in result.values()
+    order = sorted(
+        range(len(paths)), key=lambda i: (dids[i], subjects[i], paths[i])
     )
-    print(f"Wrote {OUTPUT}")
+    result = {}
+    for i in order:
+        asset_entry = {
+            "path": paths[i],
+            "asset_id": asset_ids[i],
+            "regions": [regions_pool[r] for r in region_rows[i]],
+        }
+        if sessions[i]:
+            asset_entry["session"] = sessions[i]
+        if descs[i]:
+            asset_entry["desc"] = descs[i]
+        result.setdefault(dids[i], []).append(asset_entry)
+
+    write_dandiset_assets(OUTPUT, result)
+
+    total_assets = len(paths)
+    total_subjects = len(set(zip(dids, subjects)))
+    print(f"Wrote {OUTPUT / 'assets'}")
     print(f"  {len(result)} dandisets, {total_subjects} subjects, {total_assets} assets")
 
 
@@ -6,12 +6,24 @@ per dandiset into data/electrodes/{dandiset_id}.json, then removes the old file.
 """
 
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import orjson
+
 DATA_DIR = Path(__file__).resolve().parent.parent / "data" / "atlases" / "allen_ccf"
 OLD_FILE = DATA_DIR / "dandiset_electrodes.json"
 ELECTRODES_DIR = DATA_DIR / "electrodes"
 ELECTRODE_MANIFEST_FILE = DATA_DIR / "dandisets_with_electrodes.json"
+WRITE_WORKERS = 16
+
+
+def write_dandiset_file(item):
+    """Serialize one dandiset's coords to its own file; returns the byte count."""
+    dandiset_id, asset_coords = item
+    payload = orjson.dumps(asset_coords)
+    (ELECTRODES_DIR / f"{dandiset_id}.json").write_bytes(payload)
+    return len(payload)
 
 
 def main():
@@ -24,12 +36,11 @@ def main():
 
     ELECTRODES_DIR.mkdir(parents=True, exist_ok=True)
 
-    for dandiset_id, asset_coords in sorted(data.items()):
-        out = ELECTRODES_DIR / f"{dandiset_id}.json"
-        with open(out, "w") as f:
-            json.dump(asset_coords, f, separators=(",", ":"))
-        size_kb = out.stat().st_size / 1024
-        print(f"  {dandiset_id}.json: {len(asset_coords)} assets, {size_kb:.0f} KB")
+    items = sorted(data.items())
+    with ThreadPoolExecutor(max_workers=WRITE_WORKERS) as executor:
+        sizes = executor.map(write_dandiset_file, items)
+        for (dandiset_id, asset_coords), size in zip(items, sizes):
+            print(f"  {dandiset_id}.json: {len(asset_coords)} assets, {size / 1024:.0f} KB")
 
     # Write manifest of dandiset IDs with electrode data (for frontend)
     with open(ELECTRODE_MANIFEST_FILE, "w") as f:
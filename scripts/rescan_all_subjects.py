@@ -2,7 +2,7 @@
 
 Uses the existing label_cache.jsonl as a starting point, fetches all NWB assets
 for each dandiset, picks one per subject, and processes any missing ones.
-Appends new results to label_cache.jsonl, then regenerates dandiset_assets.json.
+Appends new results to label_cache.jsonl, then regenerates the per-dandiset asset files.
 """
 
 import json
@@ -15,6 +15,7 @@ from pathlib import Path
 ANALYZE_DIR = Path(os.path.expanduser("~/dev/sandbox/analyze-locations"))
 sys.path.insert(0, str(ANALYZE_DIR))
 
+from dandi_helpers import write_dandiset_assets
 from label_anatomy import (
     load_or_fetch_allen_mapping,
     build_lookup_dicts,
@@ -24,7 +25,7 @@ from label_anatomy import (
 )
 
 LABEL_CACHE = ANALYZE_DIR / LABEL_CACHE_FILE
-OUTPUT = Path(__file__).resolve().parent.parent / "data" / "atlases" / "allen_ccf" / "dandiset_assets.json"
+OUTPUT = Path(__file__).resolve().parent.parent / "data" / "atlases" / "allen_ccf"
 FILTER_IDS = {997, 8}
 
 
@@ -115,7 +116,7 @@ def main():
     print(f"\n{'=' * 50}")
     print(f"Added {total_new} new entries to label_cache.jsonl")
 
-    # Now regenerate dandiset_assets.json
+    # Now regenerate the per-dandiset asset files
     print(f"\nRegenerating {OUTPUT} ...")
 
     dandisets = defaultdict(lambda: defaultdict(list))
@@ -151,8 +152,7 @@ def main():
             })
         result[did] = assets
 
-    with open(OUTPUT, "w") as f:
-        json.dump(result, f, separators=(",", ":"))
+    write_dandiset_assets(OUTPUT, result)
 
     total_assets = sum(len(v) for v in result.values())
     total_subjects = total_assets  # one per subject
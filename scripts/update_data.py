@@ -8,28 +8,38 @@ Usage:
     python scripts/update_data.py                        # incremental (default)
     python scripts/update_data.py --mode full            # full rebuild
     python scripts/update_data.py --dandiset 000017      # specific dandiset(s)
-    python scripts/update_data.py --workers 4            # parallel workers
+    python scripts/update_data.py --workers 16           # parallel workers
 """
 
 import argparse
-import json
+import atexit
+import os
+import pickle
+import queue
+import re
 import threading
 import time
 from collections import defaultdict
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
+from itertools import groupby
+from operator import itemgetter
 from pathlib import Path
 
+import orjson
+import requests
 from tqdm import tqdm
 
 from dandi_helpers import (
     FILTER_IDS,
+    TRIVIAL_LOCATIONS,
     build_dandi_regions,
     build_lookup_dicts,
     build_parent_map,
     check_species_mouse,
     compute_mesh_set,
     download_meshes,
+    dump_json,
     extract_desc,
     extract_electrode_coords,
     extract_locations,
@@ -41,7 +51,12 @@ from dandi_helpers import (
     get_nwb_assets_paged,
     iter_all_dandisets,
     iter_dandisets_modified_since,
+    load_dandiset_assets,
+    load_json,
     match_location,
+    open_nwb,
+    precompute_ancestors,
+    write_dandiset_assets,
 )
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
@@ -51,54 +66,197 @@ SCRIPT_DIR = Path(__file__).resolve().parent
 
 LABEL_CACHE_FILE = SCRIPT_DIR / "label_cache.jsonl"
 ELECTRODE_CACHE_FILE = SCRIPT_DIR / "electrode_cache.jsonl"
+META_CACHE_FILE = SCRIPT_DIR / "dandiset_meta_cache.json"
+ASSET_LISTING_CACHE_DIR = SCRIPT_DIR / "asset_listing_cache"
 LAST_UPDATED_FILE = PROJECT_ROOT / "data" / "last_updated.json"
 
+# Legacy IBL (000409) file variants excluded from processing. The
+# "-raw-only_ecephys+image" variant is covered by "_ecephys+image"; combined
+# behavior+ecephys files are excluded unless they are the desc-processed ones.
+_IBL_EXCLUDE_RE = re.compile(
+    r"-processed-only_behavior\.nwb$"
+    r"|_behavior\+ecephys\+image\.nwb"
+    r"|_ecephys\+image\.nwb"
+    r"|^(?!.*_desc-processed_).*_behavior\+ecephys\.nwb"
+)
+
+# Parallel DANDI API lookups for the Step 3 species check
+SPECIES_CHECK_WORKERS = 16
+# Parallel reads of existing per-dandiset electrode files in Step 6
+ELECTRODE_READ_WORKERS = 16
+
+# Adaptive concurrency for NWB streaming: the active limit starts halfway
+# between ADAPTIVE_MIN_WORKERS and --workers and moves between them once per
+# epoch, so the default of 16 is reached after a few good epochs.
+ADAPTIVE_MIN_WORKERS = 4
+ADAPTIVE_EPOCH_SECONDS = 5
+ADAPTIVE_STEP = 2
+# Weight of the newest epoch in the smoothed (EWMA) completion rate; asset
+# sizes vary by orders of magnitude, so single epochs are noisy.
+ADAPTIVE_SMOOTHING = 0.3
+# The smoothed rate may dip this much before the limit steps back down
+ADAPTIVE_TOLERANCE = 0.75
+
 
 # ---------------------------------------------------------------------------
 # Cache helpers
 # ---------------------------------------------------------------------------
 
 
-def load_label_cache():
-    """Load JSONL label cache; returns dict of (dandiset_id, asset_id) -> entry."""
+def _load_jsonl_cache(path):
+    """Load a JSONL cache; returns dict of (dandiset_id, asset_id) -> entry.
+
+    The file is read in one call and each line parsed with orjson. The parsed
+    dict is pickled to a .idx file next to it and reused for as long as the
+    JSONL's mtime and size are unchanged; any append invalidates it. The
+    index is best-effort: an unreadable one is rebuilt, and one that cannot be
+    written is skipped.
+    """
     cache = {}
-    if not LABEL_CACHE_FILE.exists():
+    if not path.exists():
         return cache
-    with open(LABEL_CACHE_FILE) as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            entry = json.loads(line)
-            key = (entry["dandiset_id"], entry["asset_id"])
-            cache[key] = entry
+    index_path = path.with_suffix(".idx")
+    stat = path.stat()
+    key = (stat.st_mtime_ns, stat.st_size)
+    if index_path.exists():
+        try:
+            cached = pickle.loads(index_path.read_bytes())
+            if cached["key"] == key:
+                return cached["cache"]
+        except Exception:
+            # Corrupt or written by an incompatible version: rebuild it
+            pass
+
+    with open(path, "rb") as f:
+        data = f.read()
+    for line in data.split(b"\n"):
+        if not line.strip():
+            continue
+        entry = orjson.loads(line)
+        cache[(entry["dandiset_id"], entry["asset_id"])] = entry
+
+    try:
+        index_path.write_bytes(pickle.dumps({"key": key, "cache": cache}, protocol=5))
+    except OSError:
+        pass
     return cache
 
 
+def load_label_cache():
+    """Load JSONL label cache; returns dict of (dandiset_id, asset_id) -> entry."""
+    return _load_jsonl_cache(LABEL_CACHE_FILE)
+
+
 def load_electrode_cache():
     """Load JSONL electrode cache; returns dict of (dandiset_id, asset_id) -> entry."""
-    cache = {}
-    if not ELECTRODE_CACHE_FILE.exists():
-        return cache
-    with open(ELECTRODE_CACHE_FILE) as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            entry = json.loads(line)
-            key = (entry["dandiset_id"], entry["asset_id"])
-            cache[key] = entry
-    return cache
+    return _load_jsonl_cache(ELECTRODE_CACHE_FILE)
+
+
+# Cache appends are queued and written by a single background thread, so
+# workers never wait on disk I/O. Its append handles stay open until
+# flush_cache_appends(); they are unbuffered, so each entry lands in the file
+# with a single write. If the writer fails, its exception is kept and
+# re-raised by the next append or flush rather than dropping entries quietly.
+_append_queue = queue.Queue()
+_append_writer = None
+_append_writer_lock = threading.Lock()
+_append_error = None
+
+
+def _write_appends():
+    """Writer thread: append queued (path, entry) items until a None arrives."""
+    global _append_error
+    handles = {}
+    try:
+        while (item := _append_queue.get()) is not None:
+            path, entry = item
+            fh = handles.get(path)
+            if fh is None:
+                fh = handles[path] = open(path, "ab", buffering=0)
+            fh.write(orjson.dumps(entry) + b"\n")
+    except Exception as exc:
+        _append_error = exc
+    finally:
+        for fh in handles.values():
+            fh.close()
+
+
+def _append_jsonl(path, entry):
+    global _append_writer
+    if _append_error is not None:
+        raise RuntimeError("Cache writer failed") from _append_error
+    with _append_writer_lock:
+        if _append_writer is None:
+            _append_writer = threading.Thread(
+                target=_write_appends, name="cache-writer", daemon=True
+            )
+            _append_writer.start()
+            atexit.register(flush_cache_appends)
+    _append_queue.put((path, entry))
+
+
+def flush_cache_appends():
+    """Wait until all queued cache appends are on disk and close the files."""
+    global _append_writer
+    with _append_writer_lock:
+        if _append_writer is None:
+            return
+        _append_queue.put(None)
+        _append_writer.join()
+        _append_writer = None
+        if _append_error is not None:
+            raise RuntimeError("Cache writer failed; cache appends were lost") from _append_error
 
 
 def append_label_cache(entry):
-    with open(LABEL_CACHE_FILE, "a") as f:
-        f.write(json.dumps(entry) + "\n")
+    _append_jsonl(LABEL_CACHE_FILE, entry)
 
 
 def append_electrode_cache(entry):
-    with open(ELECTRODE_CACHE_FILE, "a") as f:
-        f.write(json.dumps(entry) + "\n")
+    _append_jsonl(ELECTRODE_CACHE_FILE, entry)
+
+
+def load_meta_cache():
+    """Load per-dandiset metadata cache; returns dict of dandiset_id -> entry.
+
+    Each entry records the species decision and the dandiset `modified`
+    timestamp it was made for.
+    """
+    if not META_CACHE_FILE.exists():
+        return {}
+    return load_json(META_CACHE_FILE)
+
+
+def save_meta_cache(meta_cache):
+    dump_json(META_CACHE_FILE, meta_cache)
+
+
+def list_nwb_assets(dandiset_id, modified):
+    """List a dandiset's NWB assets, reusing the cached listing when possible.
+
+    Listings are cached per dandiset together with the dandiset `modified`
+    timestamp and reused while it is unchanged. Without a timestamp (e.g.
+    --dandiset runs) the listing is always fetched. Only listings that made
+    it through every page are cached; a partial one is still returned.
+    """
+    path = ASSET_LISTING_CACHE_DIR / f"{dandiset_id}.json"
+    if modified and path.exists():
+        cached = load_json(path)
+        if cached["modified"] == modified:
+            return cached["assets"]
+
+    assets = []
+    try:
+        for asset in get_nwb_assets_paged(dandiset_id, max_assets=None, strict=True):
+            assets.append(asset)
+    except requests.HTTPError as exc:
+        tqdm.write(f"  WARNING: {exc}; using {len(assets)} assets listed so far")
+        return assets
+
+    if modified:
+        ASSET_LISTING_CACHE_DIR.mkdir(exist_ok=True)
+        dump_json(path, {"modified": modified, "assets": assets})
+    return assets
 
 
 def invalidate_cache_for_dandisets(cache, dandiset_ids):
@@ -110,31 +268,115 @@ def invalidate_cache_for_dandisets(cache, dandiset_ids):
 
 
 # ---------------------------------------------------------------------------
-# Asset processing
+# Adaptive concurrency
 # ---------------------------------------------------------------------------
 
 
-def process_asset_locations(dandiset_id, asset, lookups):
-    """Process a single NWB asset: extract locations and match against Allen CCF.
+class AdaptiveLimiter:
+    """Concurrency gate whose limit follows throughput.
 
-    Returns a result dict for the label cache.
+    Use as a context manager around each unit of network work, and call
+    report_error() for network failures (timeouts, HTTP errors); an
+    exception escaping the block counts as one too. At the end of every
+    epoch the smoothed completion rate is compared with the previous one:
+    if it held up, ADAPTIVE_STEP more slots are allowed, and if it fell
+    beyond ADAPTIVE_TOLERANCE, ADAPTIVE_STEP slots are taken away. Any
+    network failure in the epoch halves the limit instead.
     """
-    asset_id = asset["asset_id"]
-    path = asset["path"]
 
-    result = {
+    def __init__(self, min_limit, max_limit, epoch=ADAPTIVE_EPOCH_SECONDS):
+        self.min_limit = min(min_limit, max_limit)
+        self.max_limit = max_limit
+        self.limit = (self.min_limit + max_limit) // 2
+        self.epoch = epoch
+        self._active = 0
+        self._cond = threading.Condition()
+        self.start_epoch()
+
+    def start_epoch(self):
+        """Restart throughput measurement, e.g. after an idle stretch."""
+        with self._cond:
+            self._completed = 0
+            self._errors = 0
+            self._epoch_start = time.monotonic()
+            self._rate = None
+
+    def report_error(self):
+        """Count a network failure (e.g. a timeout) in the current epoch."""
+        with self._cond:
+            self._errors += 1
+
+    def __enter__(self):
+        with self._cond:
+            while self._active >= self.limit:
+                self._cond.wait()
+            self._active += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with self._cond:
+            self._active -= 1
+            self._completed += 1
+            if exc_type is not None:
+                self._errors += 1
+            now = time.monotonic()
+            elapsed = now - self._epoch_start
+            if elapsed >= self.epoch:
+                rate = self._completed / elapsed
+                prev = self._rate
+                if prev is not None:
+                    rate = ADAPTIVE_SMOOTHING * rate + (1 - ADAPTIVE_SMOOTHING) * prev
+                if self._errors:
+                    self.limit = max(self.min_limit, self.limit // 2)
+                elif prev is None or rate >= prev * ADAPTIVE_TOLERANCE:
+                    self.limit = min(self.max_limit, self.limit + ADAPTIVE_STEP)
+                else:
+                    self.limit = max(self.min_limit, self.limit - ADAPTIVE_STEP)
+                self._rate = rate
+                self._completed = 0
+                self._errors = 0
+                self._epoch_start = now
+            self._cond.notify_all()
+        return False
+
+
+# ---------------------------------------------------------------------------
+# Asset processing
+# ---------------------------------------------------------------------------
+
+
+def _new_label_result(dandiset_id, asset):
+    """Return an empty label cache entry for an asset."""
+    return {
         "dandiset_id": dandiset_id,
-        "asset_id": asset_id,
-        "path": path,
+        "asset_id": asset["asset_id"],
+        "path": asset["path"],
         "status": "unknown",
         "matched_locations": {},
         "unmatched_locations": [],
         "error": None,
     }
 
+
+def _new_electrode_entry(dandiset_id, asset):
+    """Return an electrode cache entry for an asset with no coordinates."""
+    return {
+        "dandiset_id": dandiset_id,
+        "asset_id": asset["asset_id"],
+        "path": asset["path"],
+        "coords": None,
+    }
+
+
+def process_asset_locations(dandiset_id, asset, lookups, nwb):
+    """Extract locations from an open NWB asset and match against Allen CCF.
+
+    Returns a result dict for the label cache.
+    """
+    result = _new_label_result(dandiset_id, asset)
+
     try:
-        download_url = get_download_url(dandiset_id, asset_id)
-        img_locs, elec_locs, ice_locs = extract_locations(download_url)
+        img_locs, elec_locs, ice_locs = extract_locations(nwb)
     except Exception as exc:
         result["status"] = "error"
         result["error"] = str(exc)
@@ -153,7 +395,6 @@ def process_asset_locations(dandiset_id, asset, lookups):
                 for s in structures
             ]
         else:
-            from dandi_helpers import TRIVIAL_LOCATIONS
             if loc.strip().lower() not in TRIVIAL_LOCATIONS:
                 result["unmatched_locations"].append(loc)
 
@@ -165,107 +406,128 @@ def process_asset_locations(dandiset_id, asset, lookups):
     return result
 
 
-def process_asset_electrodes(dandiset_id, asset):
-    """Process a single NWB asset: extract electrode coordinates.
+def process_asset_electrodes(dandiset_id, asset, nwb):
+    """Extract electrode coordinates from an open NWB asset.
 
     Returns a result dict for the electrode cache.
     """
-    asset_id = asset["asset_id"]
-    path = asset["path"]
-
-    entry = {
-        "dandiset_id": dandiset_id,
-        "asset_id": asset_id,
-        "path": path,
-        "coords": None,
-    }
+    entry = _new_electrode_entry(dandiset_id, asset)
 
     try:
-        url = get_download_url(dandiset_id, asset_id)
-        coords = extract_electrode_coords(url)
-        entry["coords"] = coords
+        entry["coords"] = extract_electrode_coords(nwb)
     except Exception as exc:
-        tqdm.write(f"  Electrode error {dandiset_id}/{path}: {exc}")
+        tqdm.write(f"  Electrode error {dandiset_id}/{asset['path']}: {exc}")
 
     return entry
 
 
+def _is_network_error(exc):
+    """True if exc (or anything it was raised from) is an HTTP/transport failure.
+
+    remfile reports failed range requests as plain Exceptions with these
+    message prefixes, so they are matched by text.
+    """
+    while exc is not None:
+        if isinstance(exc, (requests.RequestException, ConnectionError, TimeoutError)):
+            return True
+        if str(exc).startswith(("Error getting file length", "Error fetching bytes")):
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+def process_asset(dandiset_id, asset, lookups, limiter=None):
+    """Open a single NWB asset once and extract both locations and electrodes.
+
+    Network failures are reported to `limiter`; broken files are not, so they
+    do not reduce concurrency. Returns (label_result, electrode_result) for
+    the label and electrode caches.
+    """
+    url = get_download_url(dandiset_id, asset["asset_id"])
+    try:
+        with open_nwb(url) as nwb:
+            label_result = process_asset_locations(dandiset_id, asset, lookups, nwb)
+            electrode_result = process_asset_electrodes(dandiset_id, asset, nwb)
+    except Exception as exc:
+        # The file could not be opened: record the error in both caches
+        label_result = _new_label_result(dandiset_id, asset)
+        label_result["status"] = "error"
+        label_result["error"] = str(exc)
+        electrode_result = _new_electrode_entry(dandiset_id, asset)
+        tqdm.write(f"  Electrode error {dandiset_id}/{asset['path']}: {exc}")
+        if limiter is not None and _is_network_error(exc):
+            limiter.report_error()
+
+    return label_result, electrode_result
+
+
 # ---------------------------------------------------------------------------
 # Convert label cache to dandiset_assets format
 # ---------------------------------------------------------------------------
 
 
 def build_dandiset_assets(label_cache):
-    """Convert label cache entries to dandiset_assets.json format.
+    """Convert label cache entries to the per-dandiset assets format.
 
     Keeps all assets per subject per dandiset, with session and description
-    metadata extracted from BIDS filenames.
+    metadata extracted from BIDS filenames. Entries are sorted once by
+    (dandiset, subject, path) and grouped per dandiset in that order.
     """
-    dandisets = defaultdict(lambda: defaultdict(list))
-
-    for (ds_id, _), entry in label_cache.items():
-        path = entry["path"]
-        asset_id = entry["asset_id"]
-        matched = entry.get("matched_locations", {})
-
-        regions = []
-        seen = set()
-        for loc_key, matches in matched.items():
-            for m in matches:
-                if m["id"] not in FILTER_IDS and m["id"] not in seen:
-                    seen.add(m["id"])
-                    regions.append({
-                        "id": m["id"],
-                        "acronym": m["acronym"],
-                        "name": m["name"],
-                    })
-
-        subject = extract_subject(path)
-        asset_entry = {
-            "path": path,
-            "asset_id": asset_id,
-            "regions": regions,
-        }
-
-        session = extract_session(path)
-        if session:
-            asset_entry["session"] = session
-
-        desc = extract_desc(path)
-        if desc:
-            asset_entry["desc"] = desc
-
-        dandisets[ds_id][subject].append(asset_entry)
-
-    # Keep ALL assets per subject, sorted by path
+    entries = sorted(
+        label_cache.values(),
+        key=lambda e: (e["dandiset_id"], extract_subject(e["path"]), e["path"]),
+    )
+
     result = {}
-    for did in sorted(dandisets):
-        subjects = dandisets[did]
-        assets = []
-        for subj in sorted(subjects):
-            sorted_assets = sorted(subjects[subj], key=lambda a: a["path"])
-            assets.extend(sorted_assets)
-        result[did] = assets
+    for did, group in groupby(entries, key=itemgetter("dandiset_id")):
+        assets = result[did] = []
+        for entry in group:
+            path = entry["path"]
+            regions = []
+            seen = set()
+            for matches in entry.get("matched_locations", {}).values():
+                for m in matches:
+                    if m["id"] not in FILTER_IDS and m["id"] not in seen:
+                        seen.add(m["id"])
+                        regions.append({
+                            "id": m["id"],
+                            "acronym": m["acronym"],
+                            "name": m["name"],
+                        })
+
+            asset_entry = {
+                "path": path,
+                "asset_id": entry["asset_id"],
+                "regions": regions,
+            }
+
+            session = extract_session(path)
+            if session:
+                asset_entry["session"] = session
+
+            desc = extract_desc(path)
+            if desc:
+                asset_entry["desc"] = desc
+
+            assets.append(asset_entry)
 
     return result
 
 
 def build_dandiset_electrodes(electrode_cache):
-    """Convert electrode cache entries to dandiset_electrodes.json format."""
-    results = defaultdict(dict)
+    """Convert electrode cache entries to the per-dandiset electrodes format.
 
-    for (ds_id, _), entry in electrode_cache.items():
-        if entry.get("coords"):
-            asset_id = entry["asset_id"]
-            results[ds_id][asset_id] = entry["coords"]
-
-    output = {}
-    for dandiset_id in sorted(results):
-        asset_coords = results[dandiset_id]
-        if asset_coords:
-            output[dandiset_id] = dict(sorted(asset_coords.items()))
-
-    return output
+    Entries with coordinates are sorted once by (dandiset, asset) and grouped
+    per dandiset in that order.
+    """
+    entries = sorted(
+        (e for e in electrode_cache.values() if e.get("coords")),
+        key=itemgetter("dandiset_id", "asset_id"),
+    )
+    return {
+        did: {e["asset_id"]: e["coords"] for e in group}
+        for did, group in groupby(entries, key=itemgetter("dandiset_id"))
+    }
 
 
 # ---------------------------------------------------------------------------
@@ -284,8 +546,8 @@ def main():
         help="Process specific dandiset(s) only",
     )
     parser.add_argument(
-        "--workers", type=int, default=4,
-        help="Parallel workers for NWB streaming (default: 4)",
+        "--workers", type=int, default=16,
+        help="Maximum parallel workers for NWB streaming (default: 16)",
     )
     args = parser.parse_args()
 
@@ -304,12 +566,14 @@ def main():
     lookups = build_lookup_dicts(structures)
 
     # Save structure graph
-    with open(DATA_DIR / "structure_graph.json", "w") as f:
-        json.dump(graph_msg, f)
+    dump_json(DATA_DIR / "structure_graph.json", graph_msg)
     print("  Saved structure_graph.json")
 
     # ── Step 2: Determine target dandisets ────────────────────────────────
     is_full = args.mode == "full"
+    # Listing metadata per dandiset; its `modified` keys the species and
+    # asset listing caches
+    listed = {}
 
     if args.dandiset:
         # Specific dandisets requested
@@ -320,13 +584,13 @@ def main():
         target_ids = set()
         for ds in iter_all_dandisets():
             target_ids.add(ds["identifier"])
+            listed[ds["identifier"]] = ds
         print(f"  Found {len(target_ids)} dandisets")
     else:
         # Incremental: find recently modified
         print("\nStep 2: Incremental — checking for modified dandisets...")
         if LAST_UPDATED_FILE.exists():
-            with open(LAST_UPDATED_FILE) as f:
-                last_data = json.load(f)
+            last_data = load_json(LAST_UPDATED_FILE)
             since = last_data.get("timestamp", "")
             print(f"  Last updated: {since}")
         else:
@@ -338,6 +602,7 @@ def main():
             target_ids = set()
             for ds in iter_dandisets_modified_since(since):
                 target_ids.add(ds["identifier"])
+                listed[ds["identifier"]] = ds
             print(f"  {len(target_ids)} dandisets modified since last update")
             if not target_ids:
                 print("  No changes detected. Writing timestamp and exiting.")
@@ -348,19 +613,57 @@ def main():
             target_ids = set()
             for ds in iter_all_dandisets():
                 target_ids.add(ds["identifier"])
+                listed[ds["identifier"]] = ds
             print(f"  Found {len(target_ids)} dandisets for full rebuild")
 
     # ── Step 3: Filter to mouse-only ──────────────────────────────────────
     print(f"\nStep 3: Filtering to mouse-only dandisets...")
-    mouse_ids = set()
-    skipped = 0
-    for ds_id in tqdm(sorted(target_ids), desc="Species check", unit="ds"):
-        if check_species_mouse(ds_id):
-            mouse_ids.add(ds_id)
+    meta_cache = load_meta_cache()
+    # Only mouse dandisets are ever processed, so any dandiset with label
+    # cache entries is known to be mouse without asking DANDI again.
+    label_cache = {} if is_full else load_label_cache()
+    known_mouse = {ds_id for ds_id, _ in label_cache}
+    species = {}
+    to_check = []
+    for ds_id in sorted(target_ids):
+        ds = listed.get(ds_id, {"identifier": ds_id})
+        modified = ds.get("modified")
+        cached = meta_cache.get(ds_id)
+        # A mouse decision sticks; a non-mouse one is rechecked once the
+        # dandiset changes, since new assets may add mouse data.
+        if cached and (cached["is_mouse"] or (modified and modified <= cached["modified"])):
+            species[ds_id] = cached["is_mouse"]
+        elif ds_id in known_mouse:
+            species[ds_id] = True
+            if modified:
+                meta_cache[ds_id] = {"is_mouse": True, "modified": modified}
         else:
-            skipped += 1
+            to_check.append(ds)
+    reused = len(species)
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=SPECIES_CHECK_WORKERS) as executor:
+        futures = {executor.submit(check_species_mouse, ds["identifier"]): ds for ds in to_check}
+        for future in tqdm(as_completed(futures), total=len(futures),
+                           desc="Species check", unit="ds"):
+            ds = futures[future]
+            exc = future.exception()
+            if exc:
+                # Skipped for this run only; nothing is cached for it
+                tqdm.write(f"  Species check error {ds['identifier']}: {exc}")
+                failed += 1
+                continue
+            is_mouse = future.result()
+            species[ds["identifier"]] = is_mouse
+            if ds.get("modified"):
+                meta_cache[ds["identifier"]] = {"is_mouse": is_mouse, "modified": ds["modified"]}
+    save_meta_cache(meta_cache)
+
+    mouse_ids = {ds_id for ds_id, is_mouse in species.items() if is_mouse}
+    skipped = len(species) - len(mouse_ids)
 
-    print(f"  {len(mouse_ids)} mouse dandisets, {skipped} skipped (non-mouse)")
+    print(f"  {len(mouse_ids)} mouse dandisets, {skipped} skipped (non-mouse), "
+          f"{reused} from cache, {failed} failed")
 
     if not mouse_ids:
         print("  No mouse dandisets to process.")
@@ -375,7 +678,7 @@ def main():
         electrode_cache = {}
         print("  Full mode — starting with empty caches")
     else:
-        label_cache = load_label_cache()
+        # label_cache was already loaded for the species check in Step 3
         electrode_cache = load_electrode_cache()
         print(f"  Loaded {len(label_cache)} label entries, {len(electrode_cache)} electrode entries")
 
@@ -386,8 +689,9 @@ def main():
             print(f"  Invalidated {n_label} label + {n_elec} electrode cache entries for modified dandisets")
 
     # ── Step 5: Process each dandiset ─────────────────────────────────────
-    print(f"\nStep 5: Processing {len(mouse_ids)} dandisets ({args.workers} workers)...")
+    print(f"\nStep 5: Processing {len(mouse_ids)} dandisets (up to {args.workers} workers)...")
     cache_lock = threading.Lock()
+    limiter = AdaptiveLimiter(ADAPTIVE_MIN_WORKERS, args.workers)
     total_assets_processed = 0
     total_errors = 0
 
@@ -395,7 +699,7 @@ def main():
         print(f"\n--- Dandiset {ds_id} ---")
 
         # List all NWB assets, group by subject, pick first per subject
-        all_assets = list(get_nwb_assets_paged(ds_id, max_assets=None))
+        all_assets = list_nwb_assets(ds_id, listed.get(ds_id, {}).get("modified"))
         print(f"  {len(all_assets)} NWB assets")
 
         if not all_assets:
@@ -406,15 +710,8 @@ def main():
             # TEMPORARY: IBL dandiset 000409 contains legacy file variants that
             # duplicate data already present in the canonical desc-raw / desc-processed
             # files. Filter them out to avoid displaying files with wrong localization
-            if ds_id == "000409":
-                fname = asset["path"].split("/")[-1]
-                if (fname.endswith("-processed-only_behavior.nwb")
-                        or "_behavior+ecephys+image.nwb" in fname
-                        or "_ecephys+image.nwb" in fname
-                        or "-raw-only_ecephys+image.nwb" in fname
-                        or (("_behavior+ecephys.nwb" in fname)
-                            and "_desc-processed_" not in fname)):
-                    continue
+            if ds_id == "000409" and _IBL_EXCLUDE_RE.search(asset["path"].rpartition("/")[2]):
+                continue
             subj = extract_subject(asset["path"])
             subject_assets[subj].append(asset)
 
@@ -439,18 +736,15 @@ def main():
                     # Already cached, skip
                     return label_cache[cache_key]["status"]
 
-            # Process locations
-            label_result = process_asset_locations(ds_id, asset, lookups)
+            # Process locations and electrodes from a single open of the file
+            with limiter:
+                label_result, electrode_result = process_asset(ds_id, asset, lookups, limiter)
 
-            # Process electrodes
-            electrode_result = process_asset_electrodes(ds_id, asset)
+            append_label_cache(label_result)
+            append_electrode_cache(electrode_result)
 
             with cache_lock:
-                # Store in caches
-                append_label_cache(label_result)
                 label_cache[cache_key] = label_result
-
-                append_electrode_cache(electrode_result)
                 electrode_cache[cache_key] = electrode_result
 
                 total_assets_processed += 1
@@ -465,65 +759,78 @@ def main():
 
             return label_result["status"]
 
-        # Early stopping: probe first EARLY_STOP_PROBE assets sequentially.
-        # If none have matched locations, skip the rest of this dandiset.
+        # Early stopping: probe the first EARLY_STOP_PROBE assets concurrently.
+        # The rest are queued as soon as one probe matches; if none do, the
+        # rest of this dandiset is skipped.
         EARLY_STOP_PROBE = 5
         probe_items = work_items[:EARLY_STOP_PROBE]
         remaining_items = work_items[EARLY_STOP_PROBE:]
-        found_match = False
-
-        for asset in probe_items:
-            status = process_one(asset)
-            if status == "matched":
-                found_match = True
-
-        if not found_match and remaining_items:
-            print(f"  Skipping remaining {len(remaining_items)} assets "
-                  f"(no matches in first {len(probe_items)})")
-            continue
 
+        limiter.start_epoch()
         with ThreadPoolExecutor(max_workers=args.workers) as executor:
-            futures = {executor.submit(process_one, asset): asset for asset in remaining_items}
+            futures = {executor.submit(process_one, asset): asset for asset in probe_items}
+            found_match = False
+            for future in as_completed(futures):
+                if not future.exception() and future.result() == "matched":
+                    found_match = True
+                    break
+
+            if found_match:
+                futures.update(
+                    {executor.submit(process_one, asset): asset for asset in remaining_items}
+                )
+            elif remaining_items:
+                print(f"  Skipping remaining {len(remaining_items)} assets "
+                      f"(no matches in first {len(probe_items)})")
+
             for future in as_completed(futures):
                 exc = future.exception()
                 if exc:
                     asset = futures[future]
                     tqdm.write(f"  Worker error {ds_id}/{asset['path']}: {exc}")
 
+    flush_cache_appends()
+
     # ── Step 6: Build data files ──────────────────────────────────────────
     print(f"\n\nStep 6: Building data files...")
 
     electrodes_dir = DATA_DIR / "electrodes"
 
     def load_existing_electrodes():
-        """Load existing per-dandiset electrode files into a single dict."""
-        result = {}
-        if electrodes_dir.exists():
-            for fp in electrodes_dir.glob("*.json"):
-                did = fp.stem
-                with open(fp) as f:
-                    result[did] = json.load(f)
-        return result
+        """Load existing per-dandiset electrode files into a single dict.
+
+        Files are read and parsed concurrently.
+        """
+        if not electrodes_dir.exists():
+            return {}
+        with os.scandir(electrodes_dir) as it:
+            entries = [e for e in it if e.name.endswith(".json") and e.is_file()]
+
+        def read_one(entry):
+            return entry.name[:-len(".json")], load_json(entry.path)
+
+        with ThreadPoolExecutor(max_workers=ELECTRODE_READ_WORKERS) as executor:
+            return dict(executor.map(read_one, entries))
+
+    def load_existing_assets():
+        """Load the existing per-dandiset asset shards; {} if there are none yet."""
+        try:
+            return load_dandiset_assets(DATA_DIR)
+        except FileNotFoundError:
+            return {}
 
     if not is_full and not args.dandiset:
-        # Incremental: merge with existing data
-        existing_assets_path = DATA_DIR / "dandiset_assets.json"
-
-        if existing_assets_path.exists():
-            with open(existing_assets_path) as f:
-                existing_assets = json.load(f)
-            full_label_cache = load_label_cache()
-            dandiset_assets = build_dandiset_assets(full_label_cache)
-            for did in existing_assets:
-                if did not in dandiset_assets and did not in mouse_ids:
-                    dandiset_assets[did] = existing_assets[did]
-        else:
-            full_label_cache = load_label_cache()
-            dandiset_assets = build_dandiset_assets(full_label_cache)
+        # Incremental: merge with existing data. The in-memory caches already
+        # hold every cached entry plus this run's appends.
+        existing_assets = load_existing_assets()
+        dandiset_assets = build_dandiset_assets(label_cache)
+        for did in existing_assets:
+            if did not in dandiset_assets and did not in mouse_ids:
+                dandiset_assets[did] = existing_assets[did]
+        changed_ids = mouse_ids
 
         existing_electrodes = load_existing_electrodes()
-        full_electrode_cache = load_electrode_cache()
-        dandiset_electrodes = build_dandiset_electrodes(full_electrode_cache)
+        dandiset_electrodes = build_dandiset_electrodes(electrode_cache)
         for did in existing_electrodes:
             if did not in dandiset_electrodes and did not in mouse_ids:
                 dandiset_electrodes[did] = existing_electrodes[did]
@@ -532,15 +839,10 @@ def main():
         if is_full:
             dandiset_assets = build_dandiset_assets(label_cache)
             dandiset_electrodes = build_dandiset_electrodes(electrode_cache)
+            changed_ids = None
         else:
             # Specific dandisets: merge with existing
-            existing_assets_path = DATA_DIR / "dandiset_assets.json"
-
-            dandiset_assets = {}
-            if existing_assets_path.exists():
-                with open(existing_assets_path) as f:
-                    dandiset_assets = json.load(f)
-
+            dandiset_assets = load_existing_assets()
             dandiset_electrodes = load_existing_electrodes()
 
             # Replace entries for specified dandisets
@@ -548,32 +850,35 @@ def main():
             new_electrodes = build_dandiset_electrodes(electrode_cache)
             dandiset_assets.update(new_assets)
             dandiset_electrodes.update(new_electrodes)
+            changed_ids = set(new_assets)
 
-    # Write dandiset_assets.json
-    with open(DATA_DIR / "dandiset_assets.json", "w") as f:
-        json.dump(dandiset_assets, f, separators=(",", ":"))
+    # Write per-dandiset asset files; only changed dandisets are rewritten
+    n_written = write_dandiset_assets(DATA_DIR, dandiset_assets, changed=changed_ids)
     total_assets = sum(len(v) for v in dandiset_assets.values())
-    print(f"  dandiset_assets.json: {len(dandiset_assets)} dandisets, {total_assets} assets")
+    print(f"  assets/: {len(dandiset_assets)} dandisets ({n_written} rewritten), {total_assets} assets")
 
     # Write per-dandiset electrode files
     electrodes_dir.mkdir(parents=True, exist_ok=True)
     total_electrode_assets = 0
     for dandiset_id, asset_coords in dandiset_electrodes.items():
-        with open(electrodes_dir / f"{dandiset_id}.json", "w") as f:
-            json.dump(asset_coords, f, separators=(",", ":"))
+        dump_json(electrodes_dir / f"{dandiset_id}.json", asset_coords)
         total_electrode_assets += len(asset_coords)
     print(f"  electrodes/: {len(dandiset_electrodes)} files, {total_electrode_assets} assets")
 
     # ── Step 7: Rebuild dandi_regions.json ─────────────────────────────────
     print("\nStep 7: Building dandi_regions.json...")
-    dandi_regions = build_dandi_regions(dandiset_assets, id_to_structure, parent_map)
-    with open(DATA_DIR / "dandi_regions.json", "w") as f:
-        json.dump(dandi_regions, f, indent=2)
+    ancestors = precompute_ancestors(parent_map)
+    dandi_regions = build_dandi_regions(
+        dandiset_assets, id_to_structure, parent_map, ancestors=ancestors
+    )
+    dump_json(DATA_DIR / "dandi_regions.json", dandi_regions)
     print(f"  {len(dandi_regions)} structures with DANDI data")
 
     # ── Step 8: Download meshes if needed ──────────────────────────────────
     print("\nStep 8: Checking meshes...")
-    data_ids, ancestor_ids, all_mesh_ids = compute_mesh_set(dandi_regions, parent_map)
+    data_ids, ancestor_ids, all_mesh_ids = compute_mesh_set(
+        dandi_regions, parent_map, ancestors=ancestors
+    )
 
     # Check which meshes are missing (accept either .obj or .glb)
     missing = [sid for sid in all_mesh_ids
@@ -590,9 +895,9 @@ def main():
     obj_files = list(MESHES_DIR.glob("*.obj"))
     if obj_files:
         print(f"  Converting {len(obj_files)} OBJ meshes to GLB...")
-        from convert_meshes import convert_obj_to_glb
-        for obj_path in obj_files:
-            if convert_obj_to_glb(obj_path):
+        from convert_meshes import convert_objs_to_glb
+        for obj_path, ok in convert_objs_to_glb(obj_files):
+            if ok:
                 obj_path.unlink()
 
     # Check for any missing meshes overall
@@ -609,8 +914,7 @@ def main():
         "no_mesh": sorted(all_failed),
         "root_id": 997,
     }
-    with open(DATA_DIR / "mesh_manifest.json", "w") as f:
-        json.dump(mesh_manifest, f, indent=2)
+    dump_json(DATA_DIR / "mesh_manifest.json", mesh_manifest, indent=True)
     print(f"  data: {len(data_ids)}, ancestors: {len(ancestor_ids - data_ids)}, no_mesh: {len(all_failed)}")
 
     # ── Step 10: Write last_updated.json ───────────────────────────────────
@@ -633,8 +937,7 @@ def _write_last_updated(mode, dandisets_checked, dandisets_updated, assets_proce
         "dandisets_updated": dandisets_updated,
         "assets_processed": assets_processed,
     }
-    with open(LAST_UPDATED_FILE, "w") as f:
-        json.dump(data, f, indent=2)
+    dump_json(LAST_UPDATED_FILE, data, indent=True)
     print(f"\n  Updated {LAST_UPDATED_FILE}")
 
 
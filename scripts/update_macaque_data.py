@@ -12,7 +12,7 @@ brain_region_id are fetched from DANDI 001636 by streaming each NWB file via
 HTTP (same path as build_macaque_atlas.py's fetch_dandi_data).
 
 Files written (per atlas):
-  - dandiset_assets.json
+  - assets/{dandiset_id}.json + dandisets_with_assets.json
   - dandisets_with_electrodes.json
   - dandi_regions.json
   - electrodes/001636.json   (via fetch_dandi_data)
@@ -41,7 +41,7 @@ from macaque_atlas_lib import (
     ATLAS_CONFIGS, DANDISET_ID, MACAQUE_LOCATION_ALIASES,
     fetch_dandi_data, fetch_macaque_implicit_data, _normalize_region_name,
 )
-from dandi_helpers import build_dandi_regions
+from dandi_helpers import build_dandi_regions, write_dandiset_assets
 from dandi_helpers import build_parent_map, get_ancestors
 
 
@@ -198,8 +198,7 @@ def update_atlas(atlas_key, mode):
     # ancestor propagation account for the implicit additions.
     dandi_regions = build_dandi_regions(dandiset_assets, id_to_structure, parent_map)
 
-    with open(data_dir / "dandiset_assets.json", "w") as f:
-        json.dump(dandiset_assets, f)
+    write_dandiset_assets(data_dir, dandiset_assets)
     with open(data_dir / "dandisets_with_electrodes.json", "w") as f:
         json.dump(dandisets_with_electrodes, f)
     with open(data_dir / "dandi_regions.json", "w") as f: